@@ -1,95 +1,256 @@
-from mpl_toolkits.axes_grid1 import make_axes_locatable
+"""Plots of the map and of the UAVs, in the control loop or in a background
+process"""
+import multiprocessing
+import os
+import queue
+import shutil
+import warnings
 from matplotlib import use
 
-#use("WXAgg")  # set the backend
+if os.environ.get("MPLBACKEND") is None and not os.environ.get("DISPLAY"):
+    use("Agg")  # headless machines
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
+from numpy import array, asarray, float32
+from trajectory import Trajectory
 
-plt.rcParams["animation.ffmpeg_path"] = "C:/FFmpeg/bin/ffmpeg.exe"
+# ffmpeg is searched in the PATH unless FFMPEG_PATH is set
+FFMPEG_PATH = os.environ.get("FFMPEG_PATH") or shutil.which("ffmpeg")
+if FFMPEG_PATH:
+    plt.rcParams["animation.ffmpeg_path"] = FFMPEG_PATH
 #
+COLORS = "gbmcyrk"  # of the UAVs
+
+
+def snapshot(sent=None, **kwargs) -> dict:
+    """Returns a copy of what `Plotter` draws: the measures layer 0 of the
+    map (indexed [x, y]) and the positions and trajectories ("paths") of
+    the pilots. It can be sent to another process. With `sent`, the number
+    of positions of every pilot (by id) already sent, only the "new_points"
+    are copied."""
+    pilots = kwargs["pilots"]
+    frame = {
+        "measure": asarray(kwargs["map"].measures[0], dtype=float32),
+        "ids": [pilot.vehicle.id for pilot in pilots],
+        "positions": [tuple(pilot.position_on_the_map) for pilot in pilots],
+        "time": kwargs.get("time"),
+    }
+    if sent is None:
+        frame["paths"] = [
+            asarray(pilot.previous_positions) for pilot in pilots
+        ]
+    else:
+        frame["new_points"] = [
+            array(pilot.previous_positions[sent.get(pilot.vehicle.id, 0) :])
+            for pilot in pilots
+        ]
+    return frame
 
 
 class Plotter:
-    """Plot the needed graphs"""
+    """Plot the needed graphs.
+
+    The artists are created on the first frame and then only updated
+    (`set_data`), and with an interactive backend that supports it only the
+    artists are redrawn over the saved background (blitting). The frames
+    give the whole "paths", or only the "new_points" that are appended to
+    the trajectories drawn so far.
+    """
 
     def __init__(self) -> None:
         self.plt = plt
         self.fig = self.plt.figure(figsize=(6, 6))
         left, bottom, width, height = 0.1, 0.1, 0.8, 0.8
         self.ax = self.fig.add_axes([left, bottom, width, height])
+        self.ax.set_xlabel("x [east]")
+        self.ax.set_ylabel("y [north]")
+        self.fig.suptitle("Strategy 4", fontsize=16)
         #
-        #div = make_axes_locatable(self.ax)
-        #self.cax = div.append_axes("right", size="5%", pad="5%")
-        #
-        #self.fig.canvas.manager.window.SetPosition((700, 50))
         self.cont = 0
+        self.image = None
+        self.markers = []
+        self.paths = []
+        self.trajectories = []
+        self.labels = []
+        self.clock = None
+        self._background = None
+        self.interactive = plt.get_backend().lower() != "agg"
+        self.blit = self.interactive and self.fig.canvas.supports_blit
 
-    def plot(self, **kwargs):
-        """Docstring"""
-        self.ax.clear()
-        cp = self.ax.contourf(kwargs["map"].measures[0], cmap="Reds")
-
-        # pl = self.ax.contour(kwargs["map"].measures[0], cmap="Reds")
-
-        #self.cax.cla()
-        #cb = self.fig.colorbar(cp, cax=self.cax)
-        #self.cax.set_title("$\gamma_{prob}$")
-        self.ax.plot(*kwargs["UAV_1"].position_on_the_map, "Xg", markersize=8)
-        self.ax.plot(*kwargs["UAV_2"].position_on_the_map, "Xb", markersize=8)
-        self.ax.plot(
-            kwargs["UAV_1"].previous_positions[:, 0],
-            kwargs["UAV_1"].previous_positions[:, 1],
-            "-.g",
-        )
-        self.ax.plot(
-            kwargs["UAV_2"].previous_positions[:, 0],
-            kwargs["UAV_2"].previous_positions[:, 1],
-            "-.b",
+    def plot(self, **kwargs) -> None:
+        """Draw the map and the pilots of the simulation"""
+        self.draw(snapshot(**kwargs))
+        if self.interactive:
+            self.plt.pause(0.001)
+
+    def draw(self, frame: dict) -> None:
+        """Draw a `snapshot`"""
+        if self.image is None:
+            self._create_artists(frame)
+        self.image.set_data(frame["measure"].T)  # the rows are y
+        self.image.autoscale()
+        for index, position in enumerate(frame["positions"]):
+            if "paths" in frame:
+                path = frame["paths"][index]
+            else:
+                trajectory = self.trajectories[index]
+                for point in frame["new_points"][index]:
+                    trajectory.append(point)
+                path = trajectory.view()
+            self.markers[index].set_data([position[0]], [position[1]])
+            self.paths[index].set_data(path[:, 0], path[:, 1])
+            self.labels[index].set_position((position[0] + 2, position[1]))
+        if frame["time"] is not None:
+            self.clock.set_text("t = %s s" % frame["time"])
+        self.cont += 1
+        self._refresh()
+
+    def _create_artists(self, frame: dict) -> None:
+        """Create the image, the markers, the trajectories and the labels"""
+        measure = frame["measure"].T
+        self.image = self.ax.imshow(
+            measure,
+            cmap="Reds",
+            origin="lower",
+            extent=(0, measure.shape[1] - 1, 0, measure.shape[0] - 1),
+            animated=self.blit,
         )
-        self.ax.text(
-            kwargs["UAV_1"].position_on_the_map[0] + 2,
-            kwargs["UAV_1"].position_on_the_map[1],
-            1,
-            fontsize=7,
-            bbox=dict(facecolor="w", alpha=0.6, pad=0.7),
+        for index, uav_id in enumerate(frame["ids"]):
+            color = COLORS[index % len(COLORS)]
+            (path,) = self.ax.plot([], [], "-." + color, animated=self.blit)
+            (marker,) = self.ax.plot(
+                [], [], "X" + color, markersize=8, animated=self.blit
+            )
+            label = self.ax.text(
+                0,
+                0,
+                uav_id,
+                fontsize=7,
+                bbox=dict(facecolor="w", alpha=0.6, pad=0.7),
+                animated=self.blit,
+            )
+            self.paths.append(path)
+            self.trajectories.append(Trajectory())
+            self.markers.append(marker)
+            self.labels.append(label)
+        self.clock = self.ax.text(
+            0.02, 0.96, "", transform=self.ax.transAxes, animated=self.blit
         )
-        self.ax.text(
-            kwargs["UAV_2"].position_on_the_map[0] + 2,
-            kwargs["UAV_2"].position_on_the_map[1],
-            2,
-            fontsize=7,
-            bbox=dict(facecolor="w", alpha=0.6, pad=0.7),
+        self.ax.set_xlim(0, measure.shape[1] - 1)
+        self.ax.set_ylim(0, measure.shape[0] - 1)
+
+    def _artists(self) -> list:
+        artists = [self.image] + self.paths + self.markers + self.labels
+        return artists + [self.clock]
+
+    def _refresh(self) -> None:
+        """Redraw the artists"""
+        canvas = self.fig.canvas
+        if not self.blit:
+            canvas.draw_idle()
+            return
+        if self._background is None:
+            canvas.draw()
+            self._background = canvas.copy_from_bbox(self.fig.bbox)
+        canvas.restore_region(self._background)
+        for artist in self._artists():
+            self.ax.draw_artist(artist)
+        canvas.blit(self.fig.bbox)
+        canvas.flush_events()
+
+
+class BackgroundPlotter:
+    """Plots in a separate process, so the control loop never waits for it.
+
+    `plot` takes a `snapshot` of the simulation, with only the trajectory
+    points added since the previous frame, and puts it in a queue of
+    `queue_size` frames. When the queue is full the frame is dropped (see
+    `dropped`) and its points go with the next one (`close` sends the last
+    one). The process draws the frames in a window, or saves them to
+    `output`: a `.mp4` file (with ffmpeg) or a directory of PNG files.
+    """
+
+    def __init__(self, output=None, queue_size: int = 2, fps: int = 10):
+        # fork does not import again the __main__ script
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context(
+            "fork" if "fork" in methods else "spawn"
         )
-        self.ax.set_xlabel("x [east]")
-        self.ax.set_ylabel("y [north]")
-        #
-#        self.ax.plot(
-#            *kwargs["UAV_1"].destination_on_the_map,
-#            "*g",
-#            markersize=7,
-#            label="$Destiny_{1}$"
-#        )
-#        self.ax.plot(
-#            *kwargs["UAV_2"].destination_on_the_map,
-#            "*b",
-#            markersize=7,
-#            label="$Destiny_{2}$"
-#        )
-        #        leg = self.ax.legend(loc="lower left")
-        #        #
-        #        self.ax.plot(
-        #            kwargs["lower_lon"], kwargs["lower_lat"], "xk", markersize=3
-        #        )
-        #        #
-        #        self.ax.plot(
-        #            kwargs["lower_lon"], kwargs["upper_lat"], "xk", markersize=3
-        #        )
-        #        self.ax.plot(
-        #            kwargs["upper_lon"], kwargs["lower_lat"], "xk", markersize=3
-        #        )
-        #        self.ax.plot(
-        #            kwargs["upper_lon"], kwargs["upper_lat"], "xk", markersize=3
-        #        )
-        self.fig.suptitle(
-            "Strategy 4", fontsize=16  # , Time = %i [sec]" % (kwargs["time"])
+        self.queue = context.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.sent = {}  # number of trajectory points queued, by UAV id
+        self.latest = None  # the arguments of the last dropped frame
+        self.process = context.Process(
+            target=_plot_frames, args=(self.queue, output, fps), daemon=True
         )
+        self.process.start()
+
+    def plot(self, **kwargs) -> None:
+        """Send a snapshot of the simulation to the plotting process"""
+        self.latest = kwargs
+        try:
+            if self.queue.full():
+                raise queue.Full  # no snapshot is taken
+            self._send(block=False)
+        except queue.Full:
+            self.dropped += 1
+
+    def _send(self, block: bool = True, timeout=None) -> None:
+        """Put a snapshot of the `latest` simulation in the queue"""
+        frame = snapshot(sent=self.sent, **self.latest)
+        self.queue.put(frame, block, timeout)
+        self.latest = None
+        for uav_id, points in zip(frame["ids"], frame["new_points"]):
+            self.sent[uav_id] = self.sent.get(uav_id, 0) + len(points)
+
+    def close(self, timeout: float = 30) -> None:
+        """Send the last frame if it was dropped, wait for the queued frames
+        and stop the process"""
+        if self.process.is_alive():
+            try:
+                if self.latest is not None:
+                    self._send(timeout=timeout)
+                self.queue.put(None, timeout=timeout)
+            except queue.Full:
+                self.process.terminate()
+            self.process.join(timeout)
+        self.queue.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _plot_frames(frames, output, fps: int) -> None:
+    """Draw the frames of the `frames` queue until a None"""
+    if output is not None:
+        use("Agg")
+    plotter = Plotter()
+    writer = None
+    if output is not None and output.endswith(".mp4"):
+        if FFMPEG_PATH:
+            writer = animation.FFMpegWriter(fps=fps)
+            writer.setup(plotter.fig, output, dpi=100)
+        else:
+            warnings.warn("ffmpeg was not found, the frames are saved as PNG")
+            output = output[: -len(".mp4")] + "_frames"
+    if output is not None and writer is None:
+        os.makedirs(output, exist_ok=True)
+    #
+    while True:
+        frame = frames.get()
+        if frame is None:
+            break
+        plotter.draw(frame)
+        if writer is not None:
+            writer.grab_frame()
+        elif output is not None:
+            plotter.fig.savefig(
+                os.path.join(output, "frame_%05i.png" % plotter.cont)
+            )
+        else:
+            plotter.plt.pause(0.001)
+    if writer is not None:
+        writer.finish()
@@ -0,0 +1,297 @@
+"""Comparison metrics of the strategies over the summaries of the runs, as
+in statistical_graphs.R"""
+import argparse
+import hashlib
+from numpy import (
+    asarray,
+    bincount,
+    column_stack,
+    concatenate,
+    cumsum,
+    full,
+    genfromtxt,
+    isnan,
+    lexsort,
+    median,
+    nan,
+    quantile,
+    unique,
+    zeros,
+)
+from numpy.random import SeedSequence, default_rng
+from parameters import BOOTSTRAP_SAMPLES, CONFIDENCE, RESULTS_DIR
+
+# Groups of the README: the source position, the heights of the fleet and
+# whether one of them matches the height of the source (see `derive`; use
+# `by=("match",)` for the matched vs unmatched comparison alone)
+GROUP_KEYS = (
+    "source_pos_x",
+    "source_pos_y",
+    "initial_height_1",
+    "initial_height_2",
+    "match",
+)
+# Distance to the source, time to the first detection and improvement of
+# the measure after it
+METRICS = ("dist_best2source", "firstDT", "improvement")
+# The missing value of the group keys of `RunningSummary`: being the same
+# object, the keys with a NaN compare equal
+NAN = float("nan")
+
+
+def derive(columns: dict) -> dict:
+    """Returns the columns with the float "improvement" (best_value -
+    firstDV) and "match" (1 if a UAV flies at the height of the source)"""
+    columns = {key: asarray(value) for key, value in columns.items()}
+    heights = [columns["initial_height_1"], columns["initial_height_2"]]
+    source_alt = columns.get("source_alt", 3)  # the plume is released at 3 m
+    match = (heights[0] == source_alt) | (heights[1] == source_alt)
+    columns["match"] = match.astype(int)
+    columns["improvement"] = asarray(
+        columns["best_value"], dtype=float
+    ) - asarray(columns["firstDV"], dtype=float)
+    return columns
+
+
+def group_index(columns: dict, by=GROUP_KEYS):
+    """Returns the distinct rows of the `by` columns and the group of every
+    run. The missing values (NaN) of a column form one group"""
+    values, codes = [], []
+    for key in by:
+        column_values, column_codes = unique(
+            asarray(columns[key], dtype=float), return_inverse=True
+        )
+        values.append(column_values)
+        codes.append(column_codes.reshape(-1))
+    rows, inverse = unique(column_stack(codes), axis=0, return_inverse=True)
+    groups = column_stack(
+        [column[rows[:, index]] for index, column in enumerate(values)]
+    )
+    return groups, inverse.reshape(-1)
+
+
+def grouped_medians(values, inverse, n_groups: int):
+    """Returns the median and the number of the non-NaN `values` of every
+    group, and the values sorted by group and value with the start of every
+    group"""
+    values = asarray(values, dtype=float)
+    valid = ~isnan(values)
+    values, inverse = values[valid], inverse[valid]
+    order = lexsort((values, inverse))
+    values = values[order]
+    counts = bincount(inverse, minlength=n_groups)
+    starts = concatenate(([0], cumsum(counts)[:-1]))
+    medians = full(n_groups, nan)
+    filled = counts > 0
+    lower = (starts + (counts - 1) // 2)[filled]
+    upper = (starts + counts // 2)[filled]
+    medians[filled] = (values[lower] + values[upper]) / 2
+    return medians, counts, values, starts
+
+
+def bootstrap_interval(
+    values,
+    n_boot: int = BOOTSTRAP_SAMPLES,
+    confidence: float = CONFIDENCE,
+    rng=None,
+):
+    """Returns the percentile bootstrap interval of the median of `values`.
+    The resamples are drawn as (n_boot, n) blocks of indices"""
+    values = asarray(values, dtype=float)
+    if values.size == 0:
+        return nan, nan
+    rng = rng if rng is not None else default_rng()
+    # blocks of about 4M indices
+    block = max(1, 2 ** 22 // values.size)
+    medians = zeros(n_boot)
+    for start in range(0, n_boot, block):
+        stop = min(start + block, n_boot)
+        draws = rng.integers(0, values.size, (stop - start, values.size))
+        medians[start:stop] = median(values[draws], axis=1)
+    alpha = (1 - confidence) / 2
+    low, high = quantile(medians, [alpha, 1 - alpha])
+    return low, high
+
+
+def _order(key):
+    """Returns the sort key of a group, with the NaN values last as in
+    `group_index`"""
+    return tuple(
+        (True, 0) if isnan(value) else (False, value) for value in key
+    )
+
+
+def _rng(seed: int, key):
+    """Returns the generator of the bootstrap of group `key`, so the
+    intervals do not depend on the other groups. The stream comes from the
+    bytes of the key, so any value (negative, fractional, NaN) works"""
+    digest = hashlib.sha256(asarray(key, dtype=float).tobytes()).digest()
+    return default_rng(SeedSequence([seed, int.from_bytes(digest, "little")]))
+
+
+def summarise(
+    columns: dict,
+    by=GROUP_KEYS,
+    metrics=METRICS,
+    n_boot: int = BOOTSTRAP_SAMPLES,
+    confidence: float = CONFIDENCE,
+    seed: int = 0,
+) -> dict:
+    """Returns a column per key of `by` and, per group, the number of
+    "runs", of "detections" and the median, "_low" and "_high" bootstrap
+    bounds of every metric (over the runs where it is defined)"""
+    columns = derive(columns)
+    groups, inverse = group_index(columns, by)
+    n_groups = groups.shape[0]
+    table = {key: groups[:, index] for index, key in enumerate(by)}
+    table["runs"] = bincount(inverse, minlength=n_groups)
+    table["detections"] = bincount(
+        inverse, ~isnan(columns["firstDT"].astype(float)), n_groups
+    ).astype(int)
+    for metric in metrics:
+        medians, counts, values, starts = grouped_medians(
+            columns[metric], inverse, n_groups
+        )
+        table[metric] = medians
+        table[metric + "_low"] = full(n_groups, nan)
+        table[metric + "_high"] = full(n_groups, nan)
+        for group in range(n_groups):
+            sample = values[starts[group] : starts[group] + counts[group]]
+            low, high = bootstrap_interval(
+                sample, n_boot, confidence, _rng(seed, groups[group])
+            )
+            table[metric + "_low"][group] = low
+            table[metric + "_high"][group] = high
+    return table
+
+
+class RunningSummary:
+    """`summarise` over runs that keep arriving (e.g. from a sweep).
+
+    `add` files the new runs under their group, and `summary` only
+    recomputes the groups that changed since the previous call, with the
+    same results as `summarise` over all the runs.
+    """
+
+    def __init__(
+        self,
+        by=GROUP_KEYS,
+        metrics=METRICS,
+        n_boot: int = BOOTSTRAP_SAMPLES,
+        confidence: float = CONFIDENCE,
+        seed: int = 0,
+    ):
+        self.by = tuple(by)
+        self.metrics = tuple(metrics)
+        self.n_boot = n_boot
+        self.confidence = confidence
+        self.seed = seed
+        self.groups = {}  # key: {"runs", "detections", metric: [arrays]}
+        self.rows = {}  # key: statistics of the group, until it changes
+
+    def add(self, summary: dict) -> None:
+        """Add the summary of one run"""
+        self.add_columns({key: [value] for key, value in summary.items()})
+
+    def add_columns(self, columns: dict) -> None:
+        """Add the runs of a dict of columns (e.g. `ResultsStore.load`)"""
+        columns = derive(
+            {
+                key: asarray(value, dtype=float)
+                for key, value in columns.items()
+                if key != "run"
+            }
+        )
+        groups, inverse = group_index(columns, self.by)
+        for index, row in enumerate(groups.tolist()):
+            key = tuple(NAN if isnan(value) else value for value in row)
+            members = inverse == index
+            group = self.groups.setdefault(
+                key,
+                {
+                    "runs": 0,
+                    "detections": 0,
+                    **{metric: [] for metric in self.metrics},
+                },
+            )
+            group["runs"] += int(members.sum())
+            detected = ~isnan(columns["firstDT"][members])
+            group["detections"] += int(detected.sum())
+            for metric in self.metrics:
+                values = columns[metric][members]
+                group[metric].append(values[~isnan(values)])
+            self.rows.pop(key, None)
+
+    def _statistics(self, key) -> dict:
+        """Returns the statistics of one group"""
+        group = self.groups[key]
+        row = {"runs": group["runs"], "detections": group["detections"]}
+        for metric in self.metrics:
+            values = concatenate(group[metric])
+            group[metric] = [values]
+            row[metric] = median(values) if values.size else nan
+            values.sort()
+            low, high = bootstrap_interval(
+                values, self.n_boot, self.confidence, _rng(self.seed, key)
+            )
+            row[metric + "_low"], row[metric + "_high"] = low, high
+        return row
+
+    def summary(self) -> dict:
+        """Returns the table of `summarise`"""
+        keys = sorted(self.groups, key=_order)
+        for key in keys:
+            if key not in self.rows:
+                self.rows[key] = self._statistics(key)
+        table = {
+            name: asarray([key[index] for key in keys], dtype=float)
+            for index, name in enumerate(self.by)
+        }
+        for name in self.rows[keys[0]] if keys else ():
+            table[name] = asarray([self.rows[key][name] for key in keys])
+        return table
+
+
+def read_csv(path: str) -> dict:
+    """Returns the columns of a summaries CSV file with a header (e.g.
+    Summary.csv), the missing values as NaN"""
+    data = genfromtxt(path, delimiter=",", names=True, dtype=float)
+    return {name: data[name].reshape(-1) for name in data.dtype.names}
+
+
+def format_table(table: dict) -> str:
+    """Returns the table as aligned text"""
+    names = list(table)
+    rows = [names] + [
+        [_cell(table[name][index]) for name in names]
+        for index in range(len(table[names[0]]))
+    ]
+    widths = [max(len(cell) for cell in column) for column in zip(*rows)]
+    return "\n".join(
+        "  ".join(cell.rjust(width) for cell, width in zip(row, widths))
+        for row in rows
+    )
+
+
+def _cell(value) -> str:
+    """Returns a number of a table as text"""
+    value = float(value)
+    return "%i" % value if value.is_integer() else "%.4g" % value
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--results", default=RESULTS_DIR)
+    parser.add_argument("--csv", default=None, help="read a CSV file instead")
+    parser.add_argument("--by", nargs="+", default=list(GROUP_KEYS))
+    parser.add_argument("--samples", type=int, default=BOOTSTRAP_SAMPLES)
+    args = parser.parse_args()
+    #
+    if args.csv:
+        runs = read_csv(args.csv)
+    else:
+        from results import ResultsStore
+
+        runs = ResultsStore(args.results).load()
+        del runs["run"]
+    print(format_table(summarise(runs, by=args.by, n_boot=args.samples)))
@@ -0,0 +1,273 @@
+"""Lockstep simulation of many independent Strategy4 runs as NumPy arrays"""
+from numpy import (
+    arange,
+    array,
+    clip,
+    cos,
+    full,
+    interp,
+    maximum,
+    minimum,
+    nan,
+    newaxis,
+    ones,
+    pi,
+    rint,
+    spacing,
+    sqrt,
+    where,
+    zeros,
+)
+from numpy.linalg import norm
+from numpy.random import default_rng
+from parameters import (
+    GROUND_SPEED,
+    POLLUTANT_THRESHOLD,
+    INITIAL_TIME_4_PLUME,
+    SIMULATION_TIME,
+    INITIAL_DRONE_LOCATIONS,
+    HEIGHTS_UAV,
+    PARTITION,
+)
+from fleet import partition_domain
+
+EARTH_RADIUS = 6378137.0  # Radius of "spherical" earth
+
+
+class BatchedStrategy4:
+    """`n_runs` independent Strategy4 missions advanced in lockstep.
+
+    Every quantity of the pilots of `pilot.py` is held as an array with one
+    row per run: positions and destinations are (n_runs, n_uav, 2) cells,
+    the shared fitness is (n_runs,), and the random steps of all the UAVs are
+    drawn at once. The UAVs fly like the kinematic vehicles (straight lines
+    at GROUND_SPEED towards the overshot `simple_goto` target) and the plume
+    is read with one gather per tick for all runs and UAVs. The probability
+    map is not built, only the experiment summaries are computed.
+    """
+
+    def __init__(
+        self,
+        reference_map,
+        plume,
+        source_gps,
+        n_runs: int,
+        heights=HEIGHTS_UAV,
+        initial_cells=INITIAL_DRONE_LOCATIONS,
+        seed=None,
+        partition: str = PARTITION,
+    ):
+        self.reference_map = reference_map
+        self.plume = plume
+        self.source_gps = source_gps
+        self.n_runs = n_runs
+        self.heights = array(heights)
+        self.n_uav = len(heights)
+        self.rng = default_rng(seed)
+        #
+        self.limits = array(reference_map.size())
+        self.cell_size = array([reference_map.l_x, reference_map.l_y])
+        cells = array(initial_cells, dtype=float)[newaxis].repeat(n_runs, 0)
+        #
+        # State of the pilots
+        self.position = cells.copy()  # continuous, in cells
+        self.cell = rint(cells).astype(int)  # position_on_the_map
+        self.previous_cell = self.cell.copy()
+        self.destination = self.cell.copy()
+        self.target_distance = full((n_runs, self.n_uav), 10000.0)
+        self.exploitation = zeros(n_runs, dtype=bool)
+        self.fitness = full(n_runs, -float("inf"))
+        self.fitness_position = full((n_runs, 2), 50)
+        #
+        # Parts of the search area explored by each UAV
+        domains = partition_domain(self.limits, self.n_uav, partition)
+        self.lower = array([lower for lower, _ in domains])
+        self.upper = array([upper for _, upper in domains])
+        #
+        # Summaries
+        self.first_time = full(n_runs, nan)
+        self.first_value = full(n_runs, nan)
+        self.first_uav = zeros(n_runs, dtype=int)
+        self.best_value = full(n_runs, nan)
+        self.best_time = full(n_runs, nan)
+        self.best_cell = zeros((n_runs, 2), dtype=int)
+        self.best_position = zeros((n_runs, 2))  # continuous, in cells
+
+    def run(self, duration: int = SIMULATION_TIME) -> dict:
+        """Fly `duration` seconds and returns the summaries of all runs"""
+        for current_time in range(duration):
+            self.tick(current_time)
+        return self.summary()
+
+    def tick(self, current_time: int) -> None:
+        """One second of every run: measure, select the destination, move"""
+        curt = current_time + INITIAL_TIME_4_PLUME - 1
+        self.previous_cell = self.cell
+        self.cell = clip(rint(self.position), 0, self.limits).astype(int)
+        lats, lons = self.cells_to_gps(self.position)
+        pollutant = self.plume.measure_points(
+            lats, lons, self.heights[newaxis, :], curt, self.rng
+        )
+        steps = 2 * self.rng.random((self.n_runs, self.n_uav, 2)) - 1
+        detected = zeros(self.n_runs, dtype=bool)
+        #
+        # The UAVs of a run take their turns as in `Simulation`
+        for uav in range(self.n_uav):
+            measure = pollutant[:, uav]
+            cell = self.cell[:, uav]
+            detection = (self.fitness < measure) & (
+                measure > POLLUTANT_THRESHOLD
+            )
+            self._record(detection, measure, current_time, uav)
+            detected |= detection
+            #
+            remaining = self._distance(
+                self.position[:, uav], self.destination[:, uav]
+            )
+            select = remaining <= self.target_distance[:, uav] * 0.3
+            exploration = select & ~self.exploitation
+            exploitation = select & self.exploitation
+            #
+            destination = self.destination[:, uav].copy()
+            destination[exploration] = self._exploration_destination(
+                cell[exploration], steps[exploration, uav], uav
+            )
+            destination[exploitation] = self._exploitation_destination(
+                cell[exploitation],
+                self.previous_cell[exploitation, uav],
+                measure[exploitation],
+                steps[exploitation, uav],
+                self.fitness_position[exploitation],
+                self.fitness[exploitation],
+            )
+            changed = (destination != self.destination[:, uav]).any(axis=1)
+            self.target_distance[changed, uav] = self._distance(
+                self.position[changed, uav], destination[changed]
+            )
+            self.destination[:, uav] = destination
+        #
+        self.exploitation |= detected
+        self._move(1.0)
+
+    def _record(self, detection, measure, current_time, uav) -> None:
+        """Update the fitness and the summaries of the runs that detected"""
+        cell = self.cell[:, uav]
+        self.target_distance[detection, uav] = 10000.0
+        self.fitness[detection] = measure[detection]
+        self.fitness_position[detection] = cell[detection]
+        self.best_value[detection] = measure[detection]
+        self.best_time[detection] = current_time
+        self.best_cell[detection] = cell[detection]
+        # where the sample was taken, as the GPS position of `Simulation`
+        self.best_position[detection] = self.position[detection, uav]
+        first = detection & (self.first_time != self.first_time)
+        self.first_time[first] = current_time
+        self.first_value[first] = measure[first]
+        self.first_uav[first] = uav + 1
+
+    def _exploration_destination(self, cell, step_dir, uav):
+        """`Strategy4.exploration_destination` on the rows of the runs that
+        need a new destination"""
+        step = 10
+        lower, upper = self.lower[uav], self.upper[uav]
+        next_position = cell + step_dir * step / (
+            spacing(0) + norm(step_dir, axis=1)[:, newaxis]
+        )
+        # as in `Strategy4`, y is only reflected when the partition bounds it
+        reflect = array([True, (lower[1], upper[1]) != (0, self.limits[1])])
+        next_position = where(
+            reflect & (next_position < lower),
+            2 * lower - next_position,
+            next_position,
+        )
+        next_position = where(
+            reflect & (next_position > upper),
+            2 * upper - next_position,
+            next_position,
+        )
+        next_position = clip(next_position, lower, upper)
+        return next_position.astype(int)
+
+    def _exploitation_destination(
+        self, cell, previous_cell, measure, step_dir, fitness_position, fitness
+    ):
+        """`Strategy4.exploitation_destination` on the rows of the runs that
+        need a new destination"""
+        step = 5
+        lower = fitness_position - step
+        upper = fitness_position + step
+        # As in `Strategy4`, the previous x index is used for both axes
+        keep_going = 2 * cell - previous_cell[:, :1]
+        step_dir = where((measure > fitness)[:, newaxis], keep_going, step_dir)
+        next_position = cell + step_dir * step / (
+            spacing(0) + norm(step_dir, axis=1)[:, newaxis]
+        )
+        next_position = where(
+            next_position < lower, 2 * lower - next_position, next_position
+        )
+        next_position = where(
+            next_position > upper, 2 * upper - next_position, next_position
+        )
+        next_position = clip(next_position, lower, upper)
+        next_position = clip(next_position, 0, self.limits)
+        return next_position.astype(int)
+
+    def _move(self, d_t: float) -> None:
+        """Fly every UAV towards its overshot target (as
+        `Strategy4.go_to_destination`) during `d_t` seconds"""
+        target = 3 * self.destination - 2 * self.position
+        offset = (target - self.position) * self.cell_size
+        distance = sqrt((offset ** 2).sum(axis=2))
+        advance = minimum(GROUND_SPEED * d_t, distance)
+        scale = advance / maximum(distance, spacing(1))
+        self.position += offset * scale[..., newaxis] / self.cell_size
+
+    def _distance(self, position, destination):
+        """Ground distance in meters between cells"""
+        offset = (destination - position) * self.cell_size
+        return sqrt((offset ** 2).sum(axis=-1))
+
+    def cells_to_gps(self, position):
+        """Returns the (lat, lon) of the continuous cell positions"""
+        reference_map = self.reference_map
+        x_cells = arange(reference_map.n_x)
+        y_cells = arange(reference_map.n_y)
+        lons = interp(position[..., 0], x_cells, reference_map.x_lon)
+        lats = interp(position[..., 1], y_cells, reference_map.y_lat)
+        return lats, lons
+
+    def summary(self) -> dict:
+        """Returns the summary columns of the runs (NaN if no detection)"""
+        best_lat, best_lon = self.cells_to_gps(self.best_position)
+        source_lat, source_lon = self.source_gps
+        d_lat = best_lat - source_lat
+        d_lon = (best_lon - source_lon) * cos(source_lat * pi / 180)
+        distance = EARTH_RADIUS * pi / 180 * sqrt(d_lat ** 2 + d_lon ** 2)
+        detected = self.first_time == self.first_time
+        return {
+            "initial_height_1": self.heights[0] * ones(self.n_runs),
+            "initial_height_2": self.heights[-1] * ones(self.n_runs),
+            "firstDV": self.first_value,
+            "firstDT": self.first_time,
+            "firstD_uav": where(detected, self.first_uav, 0),
+            "best_value": self.best_value,
+            "best_value_time": self.best_time,
+            "best_value_x": where(detected, self.best_cell[:, 0], -1),
+            "best_value_y": where(detected, self.best_cell[:, 1], -1),
+            "dist_best2source": where(detected, distance, nan),
+        }
+
+
+if __name__ == "__main__":
+    from simulation import Simulation
+
+    experiment = Simulation(0, headless=True)
+    batch = BatchedStrategy4(
+        experiment.reference_map,
+        experiment.plume,
+        experiment.source_gps,
+        n_runs=1000,
+    )
+    summary = batch.run()
+    detected = summary["firstDT"] == summary["firstDT"]
+    print("runs with a detection: %i of %i" % (detected.sum(), batch.n_runs))
@@ -1,27 +1,62 @@
 """To implement the probabilistic map"""
-from math import exp, pi
+from math import ceil, floor
 from threading import Semaphore
 from numpy import (
-    load as load_data,
     around,
+    arange,
+    exp,
+    full,
+    log,
+    log1p,
     linspace,
     ones,
+    outer,
     zeros,
     sum as suma,
-    ceil,
-    where,
-    amin,
+    amax,
+    asarray,
+    clip,
+    column_stack,
+    diff,
+    floor as floor_,
+    searchsorted,
     sqrt,
     array,
 )
 
-from utils import get_location_meters, split_gps, saturate
+from utils import get_location_meters
+from wind import WindField
+
+# Updates of gamma between two normalisations over the whole map
+RENORMALISE_EVERY = 1000
 
 
 class CellMap:
-    """This object represents the likelihood map"""
+    """This object represents the likelihood map.
+
+    The measures setters and `update` hold `self.semaphore`, so the UAVs of
+    a mission can write to the map from parallel threads.
+    """
 
     def __init__(self, **kwarg):
+        self._init_grid(kwarg)
+        #
+        self.t_0 = 0
+        self.wind = WindField(kwarg.get("wind_x"), kwarg.get("wind_y"))
+        #
+        self._init_layers(kwarg.get("layers", 4))
+        # gamma is kept as logarithms, with the log of its running mass
+        self._log_mass = 0.0
+        self._updates = 0
+        self._detections = 0
+        self._window = (slice(0, self.n_x), slice(0, self.n_y))
+        self._dirty = None
+        self.V = 0
+        #
+        self.semaphore = Semaphore(1)
+
+    def _init_grid(self, kwarg) -> None:
+        """Set the cells of the map and their coordinates"""
         self.n_x = kwarg["cells_in_x"]
         self.n_y = kwarg["cells_in_y"]
         x_0 = kwarg["initial_cell_x"]
@@ -48,37 +83,54 @@ class CellMap:
         self.x_lon = around(x_lon[:-1] + x_with / 2, 6)
         self.y_lat = around(y_lat[:-1] + y_long / 2, 6)
         #
-        self.t_0 = 0
-        wind_x = load_data("databases/wind_x.npy")
-        wind_y = load_data("databases/wind_y.npy")
-        self.wind = sqrt(wind_x * wind_x + wind_y * wind_y)
-        #
+        # Affine transform of the uniform grid (`None` to use the centers)
+        self._lon_axis = _affine_axis(
+            self.x_lon, x_lon[0] + x_with / 2, x_with
+        )
+        self._lat_axis = _affine_axis(
+            self.y_lat, y_lat[0] + y_long / 2, y_long
+        )
+
+    def _init_layers(self, layers: int) -> None:
+        """Allocate the maps and the `layers` measures layers"""
         self.S_tl_t_k = ones((self.n_x, self.n_y)) / (self.n_x * self.n_y)
         self.S_accum = zeros((self.n_x, self.n_y))
-        self.gamma = ones((self.n_x, self.n_y)) / (self.n_x * self.n_y)
-        #
-        self.measures = [
-            zeros((self.n_x, self.n_y)),
-            zeros((self.n_x, self.n_y)),
-            zeros((self.n_x, self.n_y)),
-            zeros((self.n_x, self.n_y)),
-        ]
-        self.beta = self.S_accum
-        self.V = 0
-        #
-        self.semaphore = Semaphore(1)
+        self._log_gamma = full((self.n_x, self.n_y), -log(self.n_x * self.n_y))
+        self.measures = [zeros((self.n_x, self.n_y)) for _ in range(layers)]
 
     def set_sample(
         self, x_index: int, y_index: int, value: float, index: int = 0
     ) -> None:
         """Set the measured value in the corresponding cell"""
-        self.measures[index][x_index, y_index] = value
+        with self.semaphore:
+            self.measures[index][x_index, y_index] = value
+
+    def set_samples(self, x_indices, y_indices, values, index: int = 0):
+        """Set many measured values at once (the last one wins in repeated
+        cells)"""
+        with self.semaphore:
+            self.measures[index][x_indices, y_indices] = values
+
+    def set_frame(self, frame, index: int = 0, offset=(0, 0)) -> None:
+        """Overwrite the measures layer `index` with `frame`, the window of
+        cells that starts at the (x, y) `offset` (by default the whole
+        layer)"""
+        x_0, y_0 = offset
+        n_x, n_y = frame.shape
+        with self.semaphore:
+            self.measures[index][x_0 : x_0 + n_x, y_0 : y_0 + n_y] = frame
 
     def update(
         self, x_j: int, y_j: int, t_k: int, detection: bool = False
     ) -> None:
         """Build the source probability map based on one detection or
-        nondetection event at time t_k"""
+        nondetection event at time t_k.
+
+        Only the window of the kernel is touched: the nondetections are
+        added to the logarithm of gamma and its mass is updated from the
+        mass removed in the window. The cells changed since the last
+        `dirty_region` call are tracked.
+        """
 
         self.semaphore.acquire()
         memory = 7
@@ -87,8 +139,9 @@ class CellMap:
         else:
             t_0 = 0
         #
-        v_x = suma(self.wind[t_0:t_k, 0])
-        v_y = 0
+        # drift of the air since t_0, in the units of the original model
+        # (the sum of the wind samples is subtracted from the cell indices)
+        v_x, v_y = self.wind.displacement(t_0, t_k)
         s_x = 0.35
         s_y = 0.35
         mu = 0.95
@@ -96,73 +149,123 @@ class CellMap:
         wix = ceil(5 * sqrt(memory) * s_x)
         wiy = ceil(5 * sqrt(memory) * s_y)
         #
-        M = self.l_x * self.l_y
-        #
-        # From the article:
-        for x_i in range(0, self.n_x):
-            for y_i in range(0, self.n_y):
-                if abs(x_j - x_i - v_x) < wix and abs(y_j - y_i - v_y) < wiy:
-                    #
-                    self.S_tl_t_k[x_i, y_i] = M * (
-                        (
-                            exp(
-                                -((x_j - x_i - v_x) ** 2)
-                                / (2 * (memory) * s_x ** 2)
-                            )
-                            * exp(
-                                -((y_j - y_i - v_y) ** 2)
-                                / (2 * (memory) * s_y ** 2)
-                            )
-                        )
-                        / (2 * pi * (t_k - self.t_0) * s_x * s_y)
-                    )
-                else:
-                    self.S_tl_t_k[x_i, y_i] = 0
-
+        # From the article. The kernel is separable, so it is the outer
+        # product of one gaussian per axis, and it is zero out of the window.
+        # Its constant factor cancels out in the normalisation.
+        x_0, k_x = _kernel(x_j - v_x, self.n_x, wix, memory * s_x ** 2)
+        y_0, k_y = _kernel(y_j - v_y, self.n_y, wiy, memory * s_y ** 2)
+        s_window = outer(k_x, k_y)
+        total = suma(s_window)
         #
-        self.S_tl_t_k = self.S_tl_t_k / suma(self.S_tl_t_k)
-        #
-        if detection:
-            self.S_accum = self.S_accum + self.S_tl_t_k
-            self.beta = self.S_accum / t_k
-            self.beta = self.beta / suma(self.beta)
-        else:
-            self.gamma = self.gamma * (1 - mu * self.S_tl_t_k)
-            self.gamma = self.gamma / suma(self.gamma)
+        self.S_tl_t_k[self._window] = 0
+        self._mark_dirty(self._window)
+        self._window = (
+            slice(x_0, x_0 + k_x.size),
+            slice(y_0, y_0 + k_y.size),
+        )
+        if total > 0:
+            s_window /= total
+            self.S_tl_t_k[self._window] = s_window
+            self._mark_dirty(self._window)
+            #
+            if detection:
+                self.S_accum[self._window] += s_window
+                self._detections += 1
+            else:
+                log_gamma = self._log_gamma[self._window]
+                removed = suma(exp(log_gamma - self._log_mass) * mu * s_window)
+                self._log_gamma[self._window] = log_gamma + log1p(
+                    -mu * s_window
+                )
+                self._updates += 1
+                if removed > 0.5 or self._updates % RENORMALISE_EVERY == 0:
+                    # log1p(-removed) would lose precision
+                    self._renormalise()
+                else:
+                    self._log_mass += log1p(-removed)
         #
         self.semaphore.release()
         #
 
+    def _renormalise(self) -> None:
+        """Recompute the mass of gamma from the whole map and normalise its
+        logarithm"""
+        log_gamma = self._log_gamma
+        peak = amax(log_gamma)
+        log_gamma -= peak + log(suma(exp(log_gamma - peak)))
+        self._log_mass = 0.0
+
+    def _mark_dirty(self, window) -> None:
+        """Extend the dirty rectangle to `window`"""
+        if self._dirty is None:
+            self._dirty = window
+            return
+        rows, columns = self._dirty
+        self._dirty = (
+            slice(
+                min(rows.start, window[0].start),
+                max(rows.stop, window[0].stop),
+            ),
+            slice(
+                min(columns.start, window[1].start),
+                max(columns.stop, window[1].stop),
+            ),
+        )
+
+    def dirty_region(self):
+        """Returns the (x, y) slices of the smallest rectangle that holds the
+        cells of `S_tl_t_k`, `beta` and `gamma` changed since the previous
+        call (None if nothing changed), e.g. to redraw only that part"""
+        dirty, self._dirty = self._dirty, None
+        return dirty
+
+    @property
+    def beta(self):
+        """Normalised map of the accumulated detection events"""
+        if self._detections == 0:
+            return self.S_accum
+        return self.S_accum / self._detections
+
+    @property
+    def gamma(self):
+        """Normalised map of the accumulated nondetection events"""
+        return exp(self.log_gamma)
+
+    @property
+    def log_gamma(self):
+        """Logarithm of `gamma`"""
+        return self._log_gamma - self._log_mass
+
     def gps2cell(self, location):
-        """Returns the `location` equivalent indices on the likelihood map"""
-
-        lat, lon = split_gps(location)
-        diff_y_lat = abs(self.y_lat - lat)
-        diff_x_lon = abs(self.x_lon - lon)
-        min_x_lon = where(diff_x_lon == amin(diff_x_lon))[0]
-        min_y_lat = where(diff_y_lat == amin(diff_y_lat))[0]
-        #
-        if type(min_x_lon).__name__ == "ndarray":
-            if type(min_y_lat).__name__ == "ndarray":
-                aux_a = saturate(min_x_lon[0], 0, 99)
-                aux_b = saturate(min_y_lat[0], 0, 99)
-            else:
-                aux_a = saturate(min_x_lon[0], 0, 99)
-                aux_b = saturate(min_y_lat, 0, 99)
-        elif type(min_y_lat).__name__ == "ndarray":
-            aux_a = saturate(min_x_lon, 0, 99)
-            aux_b = saturate(min_y_lat[0], 0, 99)
+        """Returns the `location` equivalent indices on the likelihood map.
+
+        `location` can be a single point or an array of (lat, lon) rows, in
+        which case an array with one (x, y) row per point is returned.
+        """
+        if hasattr(location, "lat"):
+            points = array([location.lat, location.lon], dtype=float)
         else:
-            aux_a = saturate(min_x_lon, 0, 99)
-            aux_b = saturate(min_y_lat, 0, 99)
-        return array([aux_a, aux_b])
+            points = asarray(location, dtype=float)
+        #
+        x_index = _nearest_cell(self.x_lon, points[..., 1], self._lon_axis)
+        y_index = _nearest_cell(self.y_lat, points[..., 0], self._lat_axis)
+        if points.ndim == 1:
+            return array([x_index, y_index])
+        return column_stack((x_index, y_index))
 
     #
 
     def cell2gps(self, i, dtype="cell_indices"):
-        """Returns the global position of grid center"""
+        """Returns the global position of grid center. An array of (x, y)
+        rows returns an array with one (lat, lon) row per cell."""
 
         if dtype == "cell_indices":
+            indices = asarray(i)
+            if indices.ndim == 2 and indices.shape[1] == 2:
+                indices = indices.astype(int)
+                return column_stack(
+                    (self.y_lat[indices[:, 1]], self.x_lon[indices[:, 0]])
+                )
             if len(i) == 2:
                 return [
                     self.y_lat[int(i[1])],
@@ -184,6 +287,38 @@ class CellMap:
         return (self.n_x - 1, self.n_y - 1)
 
 
+def _kernel(center: float, n_cells: int, width: float, variance: float):
+    """Returns the first index and the values of the 1-D gaussian centered on
+    `center` over the cells closer than `width` to it"""
+    lower = max(floor(center - width) + 1, 0)
+    upper = min(ceil(center + width), n_cells)
+    cells = arange(lower, max(upper, lower))
+    return lower, exp(-((center - cells) ** 2) / (2 * variance))
+
+
+def _affine_axis(centers, origin: float, step: float):
+    """Returns the (origin, step, midpoints) of the `centers`. The step is
+    `None` if they are not uniformly spaced (up to their rounding)"""
+    midpoints = (centers[1:] + centers[:-1]) / 2
+    if centers.size > 1 and amax(abs(diff(centers) - step)) > 2e-6:
+        step = None
+    return (origin, step, midpoints)
+
+
+def _nearest_cell(centers, values, axis):
+    """Returns the index of the nearest center to each value. On uniform axes
+    the affine transform gives the two candidate cells, otherwise they are
+    found with a binary search"""
+    origin, step, midpoints = axis
+    if centers.size < 2:
+        return zeros(asarray(values).shape, dtype=int)
+    if step is None:
+        return searchsorted(midpoints, values)
+    index = clip(floor_((values - origin) / step), 0, centers.size - 2)
+    index = index.astype(int)
+    return index + (values > midpoints[index])
+
+
 if __name__ == "__main__":
     cell_parameters = {
         "cells_in_x": 100,
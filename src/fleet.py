@@ -0,0 +1,150 @@
+"""A fleet of N UAVs sharing the search area"""
+from concurrent.futures import wait
+from contextlib import ExitStack
+from pilot import Strategy4
+from shared_best import SharedBest
+from parameters import INITIAL_DRONE_LOCATIONS, HEIGHTS_UAV, PARTITION
+
+PARTITIONS = ("strips", "tiles")
+
+
+def partition_domain(limits, n_parts: int, mode: str = PARTITION) -> list:
+    """Split the map of `limits` cells in `n_parts` balanced sub-domains.
+
+    Returns one ([lower_x, lower_y], [upper_x, upper_y]) pair per part. With
+    "strips" the x axis is cut in `n_parts` bands that span the whole y axis,
+    with "tiles" the map is cut in the grid of `n_parts` tiles closest to
+    square cells. Adjacent parts overlap by one cell, as the two strips of
+    the original strategy.
+    """
+    if mode not in PARTITIONS:
+        raise ValueError(
+            "The `mode` argument must be: %s." % ", ".join(PARTITIONS)
+        )
+    if n_parts < 1:
+        raise ValueError("At least one part is needed")
+    limit_x, limit_y = limits
+    columns, rows = n_parts, 1
+    if mode == "tiles":
+        columns, rows = min(
+            (
+                (n_parts // rows_, rows_)
+                for rows_ in range(1, n_parts + 1)
+                if n_parts % rows_ == 0
+            ),
+            key=lambda grid: abs(limit_x / grid[0] - limit_y / grid[1]),
+        )
+    return [
+        ([lower_x, lower_y], [upper_x, upper_y])
+        for lower_y, upper_y in _split(limit_y, rows)
+        for lower_x, upper_x in _split(limit_x, columns)
+    ]
+
+
+def _split(limit: int, n_parts: int) -> list:
+    """Returns the (lower, upper) bounds of `n_parts` bands of the axis of
+    cells 0 to `limit` (included). The last band ends at `limit`"""
+    width = limit // n_parts
+    return [
+        (width * i, limit if i == n_parts - 1 else width * (i + 1) + 1)
+        for i in range(n_parts)
+    ]
+
+
+class Fleet:
+    """`Strategy4` pilots of N vehicles, each one exploring its own part of
+    the map.
+
+    The vehicles are opened on `__enter__` at the `locations` cells of
+    `reference_map` and closed on `__exit__`. Without `locations` they take
+    off from INITIAL_DRONE_LOCATIONS when there is one per UAV, and from the
+    center of their part of the map otherwise. The first pilot is the
+    leader. All the pilots share the `best` measure of the mission, and
+    every pilot draws from its own generator of `rngs` (or seed).
+    It can be iterated over the pilots.
+    """
+
+    def __init__(
+        self,
+        vehicle_class,
+        reference_map,
+        locations=None,
+        heights=HEIGHTS_UAV,
+        partition: str = PARTITION,
+        best=None,
+        rngs=None,
+    ):
+        self.vehicle_class = vehicle_class
+        self.rngs = rngs if rngs is not None else [None] * len(heights)
+        self.best = best if best is not None else SharedBest()
+        self.reference_map = reference_map
+        self.heights = heights
+        self.domains = partition_domain(
+            reference_map.size(), len(heights), partition
+        )
+        if locations is None:
+            locations = INITIAL_DRONE_LOCATIONS
+            if len(locations) != len(heights):
+                locations = [
+                    [(lower[0] + upper[0]) // 2, (lower[1] + upper[1]) // 2]
+                    for lower, upper in self.domains
+                ]
+        if len(locations) != len(heights):
+            raise ValueError("One location and one height per UAV are needed")
+        self.locations = locations
+        self.pilots = []
+        self._stack = None
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for index, cell in enumerate(self.locations):
+            lat, lon = self.reference_map.cell2gps(cell)
+            vehicle = self._stack.enter_context(
+                self.vehicle_class(id=index + 1, lat=lat, lon=lon)
+            )
+            self.pilots.append(
+                Strategy4(
+                    vehicle,
+                    rank="leader" if index == 0 else "folower",
+                    domain=self.domains[index],
+                    best=self.best,
+                    rng=self.rngs[index],
+                )
+            )
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.pilots = []
+        self._stack.close()
+
+    def __iter__(self):
+        return iter(self.pilots)
+
+    def __len__(self) -> int:
+        return len(self.pilots)
+
+    @property
+    def vehicles(self) -> list:
+        return [pilot.vehicle for pilot in self.pilots]
+
+    def takeoff(self, executor) -> None:
+        """Set home, GUIDED mode and takeoff of all the vehicles in parallel
+        on `executor`"""
+        futures = []
+        for vehicle in self.vehicles:
+            futures.append(executor.submit(vehicle.set_home))
+        for vehicle in self.vehicles:
+            futures.append(executor.submit(vehicle.change_mode, "GUIDED"))
+        for vehicle, height in zip(self.vehicles, self.heights):
+            futures.append(executor.submit(vehicle.takeoff, height=height))
+        wait(futures)
+
+    def set_stage(self, stage: str) -> None:
+        """Set the stage of every vehicle"""
+        for vehicle in self.vehicles:
+            vehicle.stage = stage
+
+    def step(self, d_t: float) -> None:
+        """Advance every (kinematic) vehicle `d_t` seconds"""
+        for vehicle in self.vehicles:
+            vehicle.step(d_t)
@@ -0,0 +1,190 @@
+"""Cache of the ground-truth frames of the plume"""
+import hashlib
+import os
+from collections import OrderedDict
+from threading import Lock
+from numpy import ascontiguousarray, load as load_data, save as save_data
+from parameters import (
+    FRAME_CACHE_BYTES,
+    FRAME_CACHE_DIR,
+    FRAME_CACHE_SPILL_BYTES,
+)
+
+
+class FrameCache:
+    """Least recently used cache of frames, bounded to `max_bytes`.
+
+    With `spill_dir` the computed frames are also saved there as `.npy`
+    files and loaded back when they are not in memory, so evicted frames are
+    not computed again and other processes (e.g. the workers of a sweep) and
+    later runs can reuse them. The files are written to a temporary name
+    and renamed, so a reader never sees a partial file. The least recently
+    used files are removed when they take more than `max_spill_bytes`
+    (None: no limit); the directory is checked after every sixteenth of
+    that size spilled by the process, so it can exceed it by that much per
+    process. The keys must tell the datasets apart (see
+    `dataset_signature`), as the files outlive them.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = FRAME_CACHE_BYTES,
+        spill_dir=None,
+        max_spill_bytes=FRAME_CACHE_SPILL_BYTES,
+    ):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.max_spill_bytes = max_spill_bytes
+        if spill_dir is not None:
+            os.makedirs(spill_dir, exist_ok=True)
+        self.frames = OrderedDict()
+        self.n_bytes = 0
+        self.spilled = 0  # bytes spilled since the directory was checked
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def get(self, key, compute):
+        """Returns the frame of `key`, calling `compute()` to build it if it
+        is neither in memory nor on disk"""
+        with self.lock:
+            frame = self.frames.get(key)
+            if frame is not None:
+                self.frames.move_to_end(key)
+                self.hits += 1
+                return frame
+        #
+        frame = self._load(key)
+        if frame is None:
+            frame = compute()
+            self._spill(key, frame)
+            with self.lock:
+                self.misses += 1
+        else:
+            with self.lock:
+                self.hits += 1
+        frame.setflags(write=False)
+        self._store(key, frame)
+        return frame
+
+    def _store(self, key, frame) -> None:
+        """Keep `frame` in memory, evicting the least recently used ones"""
+        with self.lock:
+            if key in self.frames:
+                return
+            self.frames[key] = frame
+            self.n_bytes += frame.nbytes
+            while self.n_bytes > self.max_bytes and len(self.frames) > 1:
+                _, old_frame = self.frames.popitem(last=False)
+                self.n_bytes -= old_frame.nbytes
+
+    def _path(self, key) -> str:
+        """Returns the file of `key` in the spill directory"""
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.spill_dir, "frame_%s.npy" % digest)
+
+    def _spill(self, key, frame) -> None:
+        """Save a frame, if there is a spill directory"""
+        if self.spill_dir is None:
+            return
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        temporary = "%s.%i.tmp" % (path, os.getpid())
+        with open(temporary, "wb") as my_file:
+            save_data(my_file, frame)
+        os.replace(temporary, path)
+        if self.max_spill_bytes is None:
+            return
+        with self.lock:
+            self.spilled += frame.nbytes
+            trim = self.spilled > self.max_spill_bytes // 16
+            if trim:
+                self.spilled = 0
+        if trim:
+            self.trim()
+
+    def trim(self) -> None:
+        """Remove the least recently used files of the spill directory until
+        they take at most `max_spill_bytes`"""
+        files = []
+        for entry in os.scandir(self.spill_dir):
+            if entry.name.startswith("frame_") and entry.name.endswith(".npy"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue  # removed by another process
+                files.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_spill_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def _load(self, key):
+        """Returns the spilled frame of `key`, or None. The file is marked as
+        used (its modification time) for `trim`"""
+        if self.spill_dir is None:
+            return None
+        path = self._path(key)
+        try:
+            os.utime(path)
+            return load_data(path)
+        except FileNotFoundError:
+            return None
+
+    def clear(self) -> None:
+        """Drop the frames kept in memory"""
+        with self.lock:
+            self.frames.clear()
+            self.n_bytes = 0
+
+    def stats(self) -> dict:
+        """Returns the counters of the cache"""
+        return {
+            "frames": len(self.frames),
+            "bytes": self.n_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def grid_signature(lats, lons) -> str:
+    """Returns a short digest of the grid spanned by `lats` and `lons`"""
+    digest = hashlib.sha1(lats.tobytes())
+    digest.update(lons.tobytes())
+    return digest.hexdigest()[:16]
+
+
+def dataset_signature(dataset, path=None) -> str:
+    """Returns a short digest of the identity of `dataset`: its shape, its
+    type, the series of its first cell (a contiguous slice, so a mapped
+    file is barely read) and, if it was read from the file `path`, the path, the size and
+    the modification time of the file"""
+    digest = hashlib.sha1(repr((dataset.shape, dataset.dtype.str)).encode())
+    if dataset.size:
+        digest.update(ascontiguousarray(dataset[0, 0]).tobytes())
+    if path is not None:
+        stat = os.stat(path)
+        digest.update(
+            repr(
+                (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+            ).encode()
+        )
+    return digest.hexdigest()[:16]
+
+
+# Cache shared by the experiments of the process, see `default_cache`
+_DEFAULT = None
+
+
+def default_cache(spill_dir=FRAME_CACHE_DIR) -> FrameCache:
+    """Returns the frame cache of the process (one per `spill_dir`)"""
+    global _DEFAULT
+    if _DEFAULT is None or _DEFAULT.spill_dir != spill_dir:
+        _DEFAULT = FrameCache(spill_dir=spill_dir)
+    return _DEFAULT
@@ -0,0 +1,152 @@
+"""Timing of the phases of the control loop"""
+import cProfile
+import json
+import pstats
+from bisect import bisect_right
+from io import StringIO
+from time import perf_counter
+
+# Upper edges of the histogram buckets, in seconds (1 us to 10 s)
+BUCKETS = [
+    mantissa * 10.0 ** exponent
+    for exponent in range(-6, 1)
+    for mantissa in (1, 2, 5)
+] + [10.0]
+
+
+class PhaseStats:
+    """Counter and histogram of the durations of one phase"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = float("inf")
+        self.maximum = 0.0
+        self.histogram = [0] * (len(BUCKETS) + 1)
+
+    def add(self, seconds: float) -> None:
+        """Record one duration"""
+        self.count += 1
+        self.total += seconds
+        self.minimum = min(self.minimum, seconds)
+        self.maximum = max(self.maximum, seconds)
+        self.histogram[bisect_right(BUCKETS, seconds)] += 1
+
+    def summary(self) -> dict:
+        """Returns the statistics as a JSON friendly dict"""
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else None,
+            "min": self.minimum if self.count else None,
+            "max": self.maximum,
+            "histogram": {
+                "buckets": BUCKETS + ["inf"],
+                "counts": self.histogram,
+            },
+        }
+
+
+class _Phase:
+    """Context manager that records the duration of its block"""
+
+    __slots__ = ("stats", "clock", "start")
+
+    def __init__(self, stats: PhaseStats, clock):
+        self.stats = stats
+        self.clock = clock
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = self.clock()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stats.add(self.clock() - self.start)
+
+
+class Instrumentation:
+    """Low-overhead timing of the control loop.
+
+    Each `phase(name)` block adds its duration to the statistics of `name`,
+    and `start_tick`/`end_tick` measure whole ticks against the `budget` in
+    seconds. With `profile` a cProfile profiler runs between `start` and
+    `stop`. `dump` writes the summary of the run as JSON, with the value of
+    every callable of `context` (e.g. the statistics of the scheduler).
+    """
+
+    def __init__(self, budget: float = 1.0, profile: bool = False):
+        self.budget = budget
+        self.clock = perf_counter
+        self.phases = {}
+        self.ticks = PhaseStats()
+        self.overruns = 0
+        self.overrun_time = 0.0
+        self.max_overrun = 0.0
+        self._tick_start = None
+        self.context = {}
+        self.profiler = cProfile.Profile() if profile else None
+
+    def phase(self, name: str) -> _Phase:
+        """Returns a context manager that times the phase `name`"""
+        stats = self.phases.get(name)
+        if stats is None:
+            # setdefault is atomic, phases can be opened by several threads
+            stats = self.phases.setdefault(name, PhaseStats())
+        return _Phase(stats, self.clock)
+
+    def start(self) -> None:
+        """Start the profiler, if any"""
+        if self.profiler is not None:
+            self.profiler.enable()
+
+    def stop(self) -> None:
+        """Stop the profiler, if any"""
+        if self.profiler is not None:
+            self.profiler.disable()
+
+    def start_tick(self) -> None:
+        """Mark the beginning of a tick"""
+        self._tick_start = self.clock()
+
+    def end_tick(self) -> float:
+        """Mark the end of a tick and returns its duration in seconds"""
+        if self._tick_start is None:
+            raise RuntimeError("end_tick called before start_tick")
+        elapsed = self.clock() - self._tick_start
+        self._tick_start = None
+        self.ticks.add(elapsed)
+        overrun = elapsed - self.budget
+        if overrun > 0:
+            self.overruns += 1
+            self.overrun_time += overrun
+            self.max_overrun = max(self.max_overrun, overrun)
+        return elapsed
+
+    def summary(self, top: int = 25) -> dict:
+        """Returns the statistics of the ticks and of every phase"""
+        summary = {
+            "budget": self.budget,
+            "ticks": self.ticks.summary(),
+            "overruns": {
+                "count": self.overruns,
+                "total": self.overrun_time,
+                "max": self.max_overrun,
+            },
+            "phases": {
+                name: stats.summary() for name, stats in self.phases.items()
+            },
+        }
+        for name, value in self.context.items():
+            summary[name] = value()
+        if self.profiler is not None:
+            stream = StringIO()
+            stats = pstats.Stats(self.profiler, stream=stream)
+            stats.sort_stats("cumulative").print_stats(top)
+            summary["profile"] = stream.getvalue()
+        return summary
+
+    def dump(self, path: str) -> None:
+        """Write the summary as JSON in `path`"""
+        with open(path, "w") as my_file:
+            json.dump(self.summary(), my_file, indent=2)
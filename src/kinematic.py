@@ -0,0 +1,151 @@
+"""In-process kinematic quadcopter, to run the simulation without SITL"""
+from math import cos, sin, sqrt, pi
+from dronekit import LocationGlobal, LocationGlobalRelative
+from parameters import GROUND_SPEED, STAGE
+
+EARTH_RADIUS = 6378137.0  # Radius of "spherical" earth
+
+
+class KinematicVehicle:
+    """Drop-in replacement of `quadcopter.Vehicle` for headless runs.
+
+    The vehicle does not move by itself: the simulation advances it with
+    `step`, so the time runs as fast as the CPU allows.
+    """
+
+    def __init__(self, **kwarg):
+        self.id = kwarg["id"]
+        self.alt = 0
+        self.stage = STAGE
+        self.groundspeed = GROUND_SPEED
+        self.home = (kwarg["lat"], kwarg["lon"])
+        self.ctrl = KinematicController(self, kwarg["lat"], kwarg["lon"])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.ctrl.close()
+
+    def location(self):
+        """Returns the current position of the vehicle"""
+        return self.ctrl.location.global_relative_frame
+
+    def set_home(self) -> None:
+        """Set the current position as the home location"""
+        self.home = (self.ctrl.lat, self.ctrl.lon)
+
+    def change_mode(self, mode: str) -> None:
+        """Set the flight mode (only stored, every mode flies the same)"""
+        self.ctrl.mode = mode
+
+    def takeoff(self, height) -> None:
+        """Climb to `height` instantaneously"""
+        self.alt = height
+        self.ctrl.alt = height
+
+    def step(self, d_t: float = 1.0) -> None:
+        """Advance the vehicle `d_t` seconds"""
+        self.ctrl.step(d_t)
+
+
+class KinematicController:
+    """The subset of the dronekit vehicle used by the pilots and `utils`.
+
+    It flies in straight lines at the ground speed of its `KinematicVehicle`
+    towards the last `simple_goto` target, or with the body velocities of the
+    last SET_POSITION_TARGET_LOCAL_NED message.
+    """
+
+    def __init__(self, vehicle: KinematicVehicle, lat: float, lon: float):
+        self.vehicle = vehicle
+        self.lat = lat
+        self.lon = lon
+        self.alt = 0
+        self.mode = "STABILIZE"
+        self.heading = 0.0  # degrees from the north, clockwise
+        self.target = None
+        self.body_velocity = None
+        self.location = _Location(self)
+        self.message_factory = _MessageFactory()
+
+    def simple_goto(self, location) -> None:
+        """Fly towards `location`"""
+        self.target = (location.lat, location.lon)
+        self.body_velocity = None
+
+    def send_mavlink(self, msg) -> None:
+        """Apply a message built by the `message_factory`"""
+        kind, values = msg
+        if kind == "velocity_body":
+            self.body_velocity = values
+            self.target = None
+        elif kind == "yaw":
+            heading, relative = values
+            if relative:
+                heading += self.heading
+            self.heading = heading % 360
+
+    def flush(self) -> None:
+        """Messages are applied immediately"""
+
+    def close(self) -> None:
+        """Nothing to release"""
+
+    def step(self, d_t: float) -> None:
+        """Move the vehicle `d_t` seconds"""
+        if self.body_velocity is not None:
+            v_x, v_y, _ = self.body_velocity
+            yaw = self.heading * pi / 180
+            d_north = (v_x * cos(yaw) - v_y * sin(yaw)) * d_t
+            d_east = (v_x * sin(yaw) + v_y * cos(yaw)) * d_t
+        elif self.target is not None:
+            d_north, d_east = self._meters_to(*self.target)
+            distance = sqrt(d_north ** 2 + d_east ** 2)
+            advance = self.vehicle.groundspeed * d_t
+            if distance > advance:
+                d_north *= advance / distance
+                d_east *= advance / distance
+        else:
+            return
+        meters_per_degree = pi / 180 * EARTH_RADIUS
+        self.lat += d_north / meters_per_degree
+        self.lon += d_east / (meters_per_degree * cos(pi * self.lat / 180))
+
+    def _meters_to(self, lat: float, lon: float):
+        """Returns the (north, east) distance to the point"""
+        meters_per_degree = pi / 180 * EARTH_RADIUS
+        d_north = (lat - self.lat) * meters_per_degree
+        d_east = (lon - self.lon) * meters_per_degree * cos(pi * lat / 180)
+        return d_north, d_east
+
+
+class _Location:
+    """The `location` attribute of a dronekit vehicle"""
+
+    def __init__(self, ctrl: KinematicController):
+        self._ctrl = ctrl
+
+    @property
+    def global_frame(self):
+        return LocationGlobal(self._ctrl.lat, self._ctrl.lon, self._ctrl.alt)
+
+    @property
+    def global_relative_frame(self):
+        return LocationGlobalRelative(
+            self._ctrl.lat, self._ctrl.lon, self._ctrl.alt
+        )
+
+
+class _MessageFactory:
+    """Encodes the MAVLink messages sent by `utils` as (kind, values)"""
+
+    @staticmethod
+    def set_position_target_local_ned_encode(*fields):
+        v_x, v_y, v_z = fields[8:11]
+        return ("velocity_body", (v_x, v_y, v_z))
+
+    @staticmethod
+    def command_long_encode(*fields):
+        heading, is_relative = fields[4], fields[7]
+        return ("yaw", (heading, is_relative))
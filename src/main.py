@@ -1,295 +1,127 @@
 """Run the simulation"""
-from concurrent.futures.thread import ThreadPoolExecutor
-from time import sleep
-from quadcopter import Vehicle
-from cellmap import CellMap
-from pollutant import PollutantDistribution
-from pilot import Strategy4, Strategy2
-from Plotter import Plotter
-from utils import get_location_meters, get_distance_metres, tic, toc
-import csv
 import argparse
+from simulation import Simulation
+from results import ResultsStore
 from parameters import (
-    CELL_PARAMETERS,
-    X0_Y0_PLUME_COORD,
-    INITIAL_DRONE1_LOCATION,
-    INITIAL_DRONE2_LOCATION,
-    SIMULATION_TIME,
-    HEIGHT_UAV1,
-    HEIGHT_UAV2,
-    POLLUTANT_THRESHOLD,
-    STAGE,
-    INITIAL_TIME_4_PLUME,
+    HEIGHTS_UAV,
+    TICK_RATE,
+    OVERRUN_POLICY,
+    PARTITION,
+    SENSOR_RATE,
+    VERBOSITY,
+    RESULTS_DIR,
 )
+from scheduler import POLICIES
+from fleet import PARTITIONS
 
 parser = argparse.ArgumentParser()
 parser.add_argument("expe", type=int)
 parser.add_argument("plume_pos", type=int)
+parser.add_argument(
+    "--headless",
+    action="store_true",
+    help="fly in-process kinematic vehicles as fast as possible (no SITL)",
+)
+parser.add_argument("--seed", type=int, default=None)
+parser.add_argument(
+    "--stats", default=None, help="write the timing summary to this JSON file"
+)
+parser.add_argument(
+    "--profile", action="store_true", help="run the loop under cProfile"
+)
+parser.add_argument(
+    "--rate", type=float, default=TICK_RATE, help="ticks per second"
+)
+parser.add_argument(
+    "--policy",
+    choices=POLICIES,
+    default=OVERRUN_POLICY,
+    help="what to do when a tick overruns its period",
+)
+parser.add_argument(
+    "--heights",
+    type=int,
+    nargs="+",
+    default=HEIGHTS_UAV,
+    help="one height per UAV of the fleet",
+)
+parser.add_argument(
+    "--locations",
+    nargs="+",
+    default=None,
+    help="initial cell x,y of each UAV (default: spread along the x axis)",
+)
+parser.add_argument("--partition", choices=PARTITIONS, default=PARTITION)
+parser.add_argument(
+    "--sensor-rate",
+    type=float,
+    default=SENSOR_RATE,
+    help="samples per second along the path of the UAVs",
+)
+parser.add_argument(
+    "--plot",
+    nargs="?",
+    const="",
+    default=None,
+    metavar="OUTPUT",
+    help="plot in a background process, in a window or saved to OUTPUT "
+    "(a directory of PNG frames or a .mp4 file)",
+)
+parser.add_argument(
+    "--telemetry",
+    default=None,
+    help="file where the state of the UAVs is logged at every tick",
+)
+parser.add_argument(
+    "--verbosity",
+    type=int,
+    choices=(0, 1, 2),
+    default=VERBOSITY,
+    help="0: no prints, 1: the detections, 2: also every command",
+)
+parser.add_argument(
+    "--results",
+    default=RESULTS_DIR,
+    help="directory of the results store (see results.py)",
+)
 args = parser.parse_args()
+locations = None
+if args.locations:
+    locations = [[int(x) for x in cell.split(",")] for cell in args.locations]
 print("********************* e%i p%i ***********************"%(args.expe, args.plume_pos))
 
-# aux
-plume_location = None
-source_gps = None
-
-# Summary parameters
-first_detection = {
-    "value": None,
-    "time": None,
-    "lat": None,
-    "lon": None,
-    "alt": None,
-    "x": None,
-    "y": None,
-    "uav": None,
-}
-best = {
-    "value": None,
-    "value_time": None,
-    "value_lat": None,
-    "value_lon": None,
-    "value_alt": None,
-    "value_x": None,
-    "value_y": None,
-    "dist2source": None,
-}
-#
-def take_measure_and_move(auto_piloto) -> None:
-    """Both UAVs need to take a measure from the same plume and save it in the map. Afer
-    that, they must go towards their destination"""
-    #
-    global STAGE, detection, pos_uavs, first_detection, best
-    #
-    curt = CURRENT_TIME + INITIAL_TIME_4_PLUME - 1
-    gps_location = auto_piloto.vehicle.location()
-    map_x, map_y = reference_map.gps2cell(gps_location)
-    auto_piloto.update_position((map_x, map_y))
-    pollutant = plume.measure_pollutant(
-        gps_location, height=auto_piloto.vehicle.alt, time=curt
-    )
-    reference_map.set_sample(
-        map_x, map_y, pollutant, auto_piloto.vehicle.alt - 3
-    )
-    #
-    aux_position = (map_x, map_y)
-    #
-    if auto_piloto.fitness[0] < pollutant > POLLUTANT_THRESHOLD:
-        STAGE = "exploitation"
-        auto_piloto.target_distance = 10000
-        auto_piloto.fitness[0] = pollutant
-        auto_piloto.fitness_position[0] = [map_x, map_y]
-        print("")
-        #
-        best["value"] = pollutant
-        best["value_time"] = CURRENT_TIME
-        best["value_lat"] = gps_location.lat
-        best["value_lon"] = gps_location.lon
-        best["value_alt"] = auto_piloto.vehicle.alt
-        best["value_x"] = map_x
-        best["value_y"] = map_y
-        best["dist2source"] = get_distance_metres(
-            [gps_location.lat, gps_location.lon], source_gps
-        )
-        #
-        print(
-            "fitness  time   lattitude   longitude   alt x   y  distance  UAV"
-        )
-        print(
-            "{0:.4f}   {1}    {2:.6f}  {3:.6f}  {4}  {5}  {6}  {7:.2}   {8}   \n\n".format(
-                best["value"],
-                best["value_time"],
-                best["value_lat"],
-                best["value_lon"],
-                best["value_alt"],
-                best["value_x"],
-                best["value_y"],
-                best["dist2source"],
-                auto_piloto.vehicle.id,
-            )
-        )
-        #
-        if not first_detection["value"]:
-            first_detection["value"] = pollutant
-            first_detection["time"] = CURRENT_TIME
-            first_detection["lat"] = gps_location.lat
-            first_detection["lon"] = gps_location.lon
-            first_detection["alt"] = auto_piloto.vehicle.alt
-            first_detection["x"] = map_x
-            first_detection["y"] = map_y
-            first_detection["uav"] = auto_piloto.vehicle.id
-    #
-    auto_piloto.select_map_destination(
-        limits=reference_map.size(),
-        leader_position=aux_position,
-        measure=pollutant,
-    )
-    new_gps_position = reference_map.cell2gps(
-        auto_piloto.destination_on_the_map
-    )
-    auto_piloto.set_gps_destination(gps_point=new_gps_position)
-    #
-    print(
-        "UAV{0}: pollutant = {1:.4f}  time {2}".format(
-            auto_piloto.vehicle.id, pollutant, CURRENT_TIME
-        ),
-        end="  ",
-    )
-    print(
-        "location: ({0},{1})  destiny: {2}  fitness = {3:.4f}  fit_pos = {4}  ".format(
-            map_x,
-            map_y,
-            auto_piloto.destination_on_the_map,
-            auto_piloto.fitness[0],
-            auto_piloto.fitness_position,
-        )
-    )
-    #
-    auto_piloto.go_to_destination()
-
-
-# Create the probability map
-reference_map = CellMap(**CELL_PARAMETERS)
-
-# Instance the plume
-plume_location = reference_map.cell2gps(X0_Y0_PLUME_COORD[args.plume_pos])
-source_gps = get_location_meters(plume_location, [4, 4])
-plume = PollutantDistribution(*plume_location)
-#
-# Simulation zone of the plume
-lower_x, lower_y = reference_map.gps2cell((plume.l_lat, plume.l_lon))
-upper_x, upper_y = reference_map.gps2cell((plume.u_lat, plume.u_lon))
-#
-lat1, lon1 = reference_map.cell2gps(INITIAL_DRONE1_LOCATION)
-lat2, lon2 = reference_map.cell2gps(INITIAL_DRONE2_LOCATION)
-#
-CURRENT_TIME = 0
-# graph = Plotter()
-#
-drone_parameters_1 = {"id": 1, "lat": lat1, "lon": lon1}
-drone_parameters_2 = {"id": 2, "lat": lat2, "lon": lon2}
-#
-def show_plume_in_map():
-    curt = CURRENT_TIME + INITIAL_TIME_4_PLUME - 1
-    for ii in range(0, 100):
-        for jj in range(0, 100):
-            pos = reference_map.cell2gps((jj, ii), "cell_indices")
-            value = plume.measure_pollutant(pos, height=HEIGHT_UAV1, time=curt)
-            reference_map.set_sample(ii, jj, value, 0)
-            value = plume.measure_pollutant(pos, height=HEIGHT_UAV2, time=curt)
-            reference_map.set_sample(ii, jj, value, 1)
-            # value = plume.measure_pollutant(pos, height=5, time=curt)
-            # reference_map.set_sample(ii, jj, value, 2)
-
+simulation = Simulation(
+    args.plume_pos,
+    heights=args.heights,
+    locations=locations,
+    partition=args.partition,
+    sensor_rate=args.sensor_rate,
+    headless=args.headless,
+    seed=args.seed,
+    profile=args.profile,
+    rate=args.rate,
+    policy=args.policy,
+    verbosity=args.verbosity,
+)
+if args.telemetry:
+    from telemetry import TelemetryLog
 
-#
-with Vehicle(**drone_parameters_1) as uav_1, Vehicle(**drone_parameters_2) as uav_2:  # type: ignore
-    pilot_1 = Strategy4(uav_1, rank="leader")
-    pilot_2 = Strategy4(uav_2, rank="folower")
-    #
-    with ThreadPoolExecutor(max_workers=2) as executor:
-        executor.submit(uav_1.set_home)
-        executor.submit(uav_2.set_home)
-        #
-        executor.submit(uav_1.change_mode, "GUIDED")
-        executor.submit(uav_2.change_mode, "GUIDED")
-        #
-        executor.submit(uav_1.takeoff, height=HEIGHT_UAV1)
-        executor.submit(uav_2.takeoff, height=HEIGHT_UAV2)
-    #
-    while CURRENT_TIME < SIMULATION_TIME:
-        tic()
-        show_plume_in_map()
-        #
-        take_measure_and_move(pilot_1)
-        take_measure_and_move(pilot_2)
-        #print("\033[F\033[F", end="")
-        #
-        to_graph = {
-            "map": reference_map,
-            "UAV_1": pilot_1,
-            "UAV_2": pilot_2,
-            "lower_lon": lower_x,
-            "lower_lat": lower_y,
-            "upper_lon": upper_x,
-            "upper_lat": upper_y,
-            "time": CURRENT_TIME,
-        }
-        #graph.plot(**to_graph)
-        #graph.plt.pause(0.001)
-        #
-        if STAGE == "exploitation":
-            pilot_1.vehicle.stage = "exploitation"
-            pilot_2.vehicle.stage = "exploitation"
+    simulation.telemetry = TelemetryLog(args.telemetry)
+if args.plot is not None:
+    from Plotter import BackgroundPlotter
 
-        CURRENT_TIME += 1
-        sleep(1-toc())
-        #
-        if CURRENT_TIME % 20 == 0:
-            pass
-            #graph.fig.savefig("./Strategy4_aux.eps", format="eps", dpi=1200)
+    simulation.graph = BackgroundPlotter(args.plot or None)
+summary = simulation.run()
+if args.plot is not None:
+    simulation.graph.close()
+if args.telemetry:
+    simulation.telemetry.close()
 #
-#graph.fig.savefig("./Strategy4_%i.eps"%(args.expe), format="eps", dpi=1200)
-#graph.fig.savefig("./Strategy4_%i.png"%(args.expe), format="png", dpi=1200)
+#simulation.graph.fig.savefig("./Strategy4_%i.eps"%(args.expe), format="eps", dpi=1200)
+#simulation.graph.fig.savefig("./Strategy4_%i.png"%(args.expe), format="png", dpi=1200)
 
-myFile = open("./databases/Strategy4.csv", "a")
-fieldnames = [
-    "source_pos_x",
-    "source_pos_y",
-    "source_lat",
-    "source_lon",
-    "source_alt",
-    "source_released_time",
-    "theshold_4_pollutant",
-    "termination_time",
-    "initial_height_1",
-    "initial_height_2",
-    "firstDV",
-    "firstDT",
-    "firstD_lat",
-    "firstD_lon",
-    "firstD_alt",
-    "firstD_x",
-    "firstD_y",
-    "firstD_uav",
-    "best_value",
-    "best_value_time",
-    "best_value_lat",
-    "best_value_lon",
-    "best_value_alt",
-    "best_value_x",
-    "best_value_y",
-    "dist_best2source",
-]
-summary = {
-    "source_pos_x": reference_map.gps2cell(source_gps)[0],
-    "source_pos_y": reference_map.gps2cell(source_gps)[1],
-    "source_lat": source_gps[0],
-    "source_lon": source_gps[1],
-    "source_alt": 3,
-    "source_released_time": INITIAL_TIME_4_PLUME,
-    "theshold_4_pollutant": POLLUTANT_THRESHOLD,
-    "termination_time": SIMULATION_TIME,
-    "initial_height_1": HEIGHT_UAV1,
-    "initial_height_2": HEIGHT_UAV2,
-    "firstDV": first_detection["value"],
-    "firstDT": first_detection["time"],
-    "firstD_lat": first_detection["lat"],
-    "firstD_lon": first_detection["lon"],
-    "firstD_alt": first_detection["alt"],
-    "firstD_x": first_detection["x"],
-    "firstD_y": first_detection["y"],
-    "firstD_uav": first_detection["uav"],
-    "best_value": best["value"],
-    "best_value_time": best["value_time"],
-    "best_value_lat": best["value_lat"],
-    "best_value_lon": best["value_lon"],
-    "best_value_alt": best["value_alt"],
-    "best_value_x": best["value_x"],
-    "best_value_y": best["value_y"],
-    "dist_best2source": best["dist2source"],
-}
-with myFile:
-    writer = csv.DictWriter(myFile, fieldnames=fieldnames, lineterminator="\n")
-    writer.writerow(summary)
+ResultsStore(args.results).add(summary)
+if args.stats:
+    simulation.instrumentation.dump(args.stats)
 
 print("************************************************************")
@@ -10,15 +10,41 @@ CELL_PARAMETERS = {
 
 X0_Y0_PLUME_COORD = [[10, 25], [60, 25], [10, 70], [60, 70]]
 
-INITIAL_DRONE1_LOCATION = [40, 50]
-INITIAL_DRONE2_LOCATION = [50, 50]
+# One cell and one height per UAV of the fleet
+INITIAL_DRONE_LOCATIONS = [[40, 50], [50, 50]]
+INITIAL_DRONE1_LOCATION, INITIAL_DRONE2_LOCATION = INITIAL_DRONE_LOCATIONS[:2]
 
 GROUND_SPEED = 10  # in [m/s]
 POLLUTANT_THRESHOLD = 0.015  # [ppm]
 INITIAL_TIME_4_PLUME = 800  # [sec]
 SIMULATION_TIME = 600  # [sec]
 
-HEIGHT_UAV1 = 3
-HEIGHT_UAV2 = 4
+HEIGHTS_UAV = [3, 4]
+LOWEST_HEIGHT = 3  # [m] of the UAVs, stored in the measures layer 0
+HEIGHT_UAV1, HEIGHT_UAV2 = HEIGHTS_UAV[:2]
+PARTITION = "strips"  # of the search area between the UAVs: strips or tiles
 
 STAGE = "exploration"
+
+TICK_RATE = 1  # [Hz] of the control loop
+OVERRUN_POLICY = "skip"  # skip, catch_up or degrade
+SENSING_RATE = [1, 1]  # [Hz] of the measures of each UAV (cycled)
+COMMAND_RATE = [1, 1]  # [Hz] of the destinations sent to each UAV (cycled)
+# [Hz] of the samples of the plume along the path of the UAVs. Above
+# TICK_RATE the whole segment flown between two measures is sampled
+SENSOR_RATE = 1
+SAMPLING_METHOD = "trilinear"  # of the path samples: nearest, time, trilinear
+# Store the probability map as tiles of MAP_TILE_SIZE cells allocated on
+# demand (TiledCellMap), for large search areas
+TILED_MAP = False
+MAP_TILE_SIZE = 64
+FRAME_CACHE_BYTES = 256 * 2 ** 20  # of ground-truth frames kept in memory
+FRAME_CACHE_DIR = None  # where to spill the evicted frames (None: drop them)
+FRAME_CACHE_SPILL_BYTES = 2 ** 30  # of spilled frames, the oldest are removed
+BACKGROUND_NOISE = 0.009  # [ppm] upper bound of the noise outside the plume
+VERBOSITY = 2  # of the prints: 0 none, 1 detections, 2 every command
+TELEMETRY_CHUNK = 1024  # records buffered before a write of the telemetry
+RESULTS_DIR = "./databases/results"  # summaries of the experiments
+BOOTSTRAP_SAMPLES = 2000  # resamples of the confidence intervals
+CONFIDENCE = 0.95  # level of the confidence intervals
+RANDOM_BLOCK = 256  # random steps drawn at once by every pilot
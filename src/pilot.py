@@ -1,12 +1,12 @@
 """To set the strategy"""
 from abc import ABCMeta, abstractmethod
-from typing import Tuple, Type
-from random import randint
-from quadcopter import Vehicle
-from parameters import GROUND_SPEED
-from numpy.random import rand, randint
+from typing import Tuple, Type, TYPE_CHECKING
+from parameters import GROUND_SPEED, RANDOM_BLOCK
+from numpy.random import default_rng
 from numpy.linalg import norm
-from numpy import spacing, clip, array, append, empty
+from numpy import spacing, clip, array
+from trajectory import Trajectory
+from shared_best import SharedBest
 from dronekit import LocationGlobalRelative
 from utils import (
     bearing_to_current_waypoint,
@@ -18,22 +18,48 @@ from utils import (
     get_distance_metres,
 )
 
+if TYPE_CHECKING:
+    from quadcopter import Vehicle
+
 Map_Point = Tuple[int, int]
 
 
 class Pilot(metaclass=ABCMeta):
-    """Abstract class to move a quadcopter"""
-
-    fitness = [-float("inf")]
-    fitness_position = [[50, 50]]
-
-    def __init__(self, vehicle: Type[Vehicle], rank: str):
+    """Abstract class to move a quadcopter. The pilots of a mission share
+    its `best` measure (a new `SharedBest` if not given). Every pilot draws
+    its random numbers from its own `rng` (a `numpy.random.Generator`, or a
+    seed for one)"""
+
+    def __init__(
+        self,
+        vehicle: "Type[Vehicle]",
+        rank: str,
+        domain=None,
+        best=None,
+        rng=None,
+    ):
         self.vehicle = vehicle
+        self.best = best if best is not None else SharedBest()
+        # ([lower_x, lower_y], [upper_x, upper_y]) cells to explore
+        self.domain = domain
         self.destination_on_the_map = None
         self.gps_destination = [25.645656, -100.288479]
         self.rank = rank
         self.position_on_the_map = None
-        self.previous_positions = empty((0, 2))
+        self.previous_positions = Trajectory()
+        self.rng = default_rng(rng)
+        self._steps = []
+        self._next_step = 0
+
+    def random_step(self):
+        """Returns a (1, 2) array uniform in [-1, 1). The steps are drawn
+        in blocks of RANDOM_BLOCK, with the same values as one by one"""
+        if self._next_step == len(self._steps):
+            self._steps = 2 * self.rng.random((RANDOM_BLOCK, 1, 2)) - 1
+            self._next_step = 0
+        step = self._steps[self._next_step]
+        self._next_step += 1
+        return step
 
     def select_map_destination(self, **kwargs) -> None:
         """Select the next point according the stage of the simulation"""
@@ -52,9 +78,7 @@ class Pilot(metaclass=ABCMeta):
 
     def update_position(self, position: Map_Point) -> None:
         self.position_on_the_map = position
-        self.previous_positions = append(
-            self.previous_positions, array([position]), axis=0
-        )
+        self.previous_positions.append(position)
 
     @abstractmethod
     def go_to_destination(self) -> None:
@@ -72,8 +96,15 @@ class Pilot(metaclass=ABCMeta):
 class Strategy2(Pilot):
     """Class that states how the strategy select the movement behavior and the destination"""
 
-    def __init__(self, vehicle: Type[Vehicle], rank: str = "folower"):
-        super(Strategy2, self).__init__(vehicle, rank)
+    def __init__(
+        self,
+        vehicle: "Type[Vehicle]",
+        rank: str = "folower",
+        domain=None,
+        best=None,
+        rng=None,
+    ):
+        super(Strategy2, self).__init__(vehicle, rank, domain, best, rng)
         self.direction = -1
         self.radius = 5
         self.max_lat_speed = 4
@@ -85,14 +116,14 @@ class Strategy2(Pilot):
     def exploration_destination(self, **kwargs) -> Map_Point:
         aux_h, aux_l = kwargs["limits"]
         return (
-            randint(aux_h // 5, 4 * aux_h // 5),
-            randint(aux_l // 5, 4 * aux_l // 5),
+            self.rng.integers(aux_h // 5, 4 * aux_h // 5),
+            self.rng.integers(aux_l // 5, 4 * aux_l // 5),
         )
 
     def exploitation_destination(self, **kwargs) -> Map_Point:
         if self.rank == "leader":
-            # return tuple(self.fitness_position)
-            return (self.fitness_position[0][0], self.fitness_position[0][1])
+            _, fitness_position = self.best.get()
+            return (fitness_position[0], fitness_position[1])
         elif self.rank == "folower":
             return kwargs["leader_position"]
         return (-1, -1)
@@ -122,8 +153,15 @@ class Strategy2(Pilot):
 class Strategy4(Pilot):
     """docstring for Strategy4"""
 
-    def __init__(self, vehicle: Type[Vehicle], rank: str = "folower"):
-        super(Strategy4, self).__init__(vehicle, rank)
+    def __init__(
+        self,
+        vehicle: "Type[Vehicle]",
+        rank: str = "folower",
+        domain=None,
+        best=None,
+        rng=None,
+    ):
+        super(Strategy4, self).__init__(vehicle, rank, domain, best, rng)
         self.target_distance = 10000.0
         self.vehicle.groundspeed = GROUND_SPEED
 
@@ -159,27 +197,38 @@ class Strategy4(Pilot):
         #
         if remaining_dist <= self.target_distance * 0.3:
             limit = kwargs["limits"]
-            new_lower_limit = limit[0] // 2 * (self.vehicle.id - 1)
-            new_upper_limit = limit[0] // 2 + new_lower_limit + 1
-            # print(f"new_lower_limit {self.vehicle.id} = ",new_lower_limit)
+            if self.domain is None:
+                self.domain = ([0, 0], list(limit))
+            new_lower_limit, new_upper_limit = self.domain
             #
             step = 10
-            rand_num = 2 * rand(1, 2) - 1
+            rand_num = self.random_step()
             next_position = self.position_on_the_map + rand_num * step / (
                 spacing(0) + norm(rand_num)
             )
             next_position = next_position[0]
 
-            if next_position[0] < new_lower_limit:
-                next_position[0] = 2 * new_lower_limit - next_position[0]
+            if next_position[0] < new_lower_limit[0]:
+                next_position[0] = 2 * new_lower_limit[0] - next_position[0]
 
-            if next_position[0] > new_upper_limit:
-                next_position[0] = 2 * new_upper_limit - next_position[0]
+            if next_position[0] > new_upper_limit[0]:
+                next_position[0] = 2 * new_upper_limit[0] - next_position[0]
+
+            # y is only reflected when the partition bounds it (tiles), the
+            # strips keep the clip of the original strategy
+            if [new_lower_limit[1], new_upper_limit[1]] != [0, limit[1]]:
+                if next_position[1] < new_lower_limit[1]:
+                    next_position[1] = (
+                        2 * new_lower_limit[1] - next_position[1]
+                    )
+
+                if next_position[1] > new_upper_limit[1]:
+                    next_position[1] = (
+                        2 * new_upper_limit[1] - next_position[1]
+                    )
 
             next_position = clip(
-                next_position,
-                [new_lower_limit, 0],
-                [new_upper_limit, limit[1]],
+                next_position, new_lower_limit, new_upper_limit
             )
             return (int(next_position[0]), int(next_position[1]))
         return self.destination_on_the_map
@@ -192,22 +241,23 @@ class Strategy4(Pilot):
         #
         if remaining_dist <= self.target_distance * 0.3:
             step = 5
+            fitness, fitness_position = self.best.get()
             new_lower_limit = [
-                self.fitness_position[0][0] - step,
-                self.fitness_position[0][1] - step,
+                fitness_position[0] - step,
+                fitness_position[1] - step,
             ]
             new_upper_limit = [
-                self.fitness_position[0][0] + step,
-                self.fitness_position[0][1] + step,
+                fitness_position[0] + step,
+                fitness_position[1] + step,
             ]
             #
-            if kwargs["measure"] > self.fitness[0]:
+            if kwargs["measure"] > fitness:
                 rand_num = (
                     2 * array(self.position_on_the_map)
                     - self.previous_positions[-2, 0]
                 )
             else:
-                rand_num = 2 * rand(1, 2) - 1
+                rand_num = self.random_step()
 
             next_position = self.position_on_the_map + rand_num * step / (
                 spacing(0) + norm(rand_num)
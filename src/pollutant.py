@@ -1,24 +1,89 @@
 """Represents the pollutan plume"""
-from random import random
-from numpy import load as load_data
+from itertools import product
+from numpy import (
+    load as load_data,
+    amax,
+    amin,
+    array,
+    asarray,
+    broadcast_arrays,
+    clip,
+    flatnonzero,
+    floor,
+    isnan,
+    nan,
+    newaxis,
+    rint,
+    where,
+)
+from numpy.random import default_rng
+from framecache import dataset_signature
 from utils import get_location_meters, split_gps, saturate
-from parameters import INITIAL_TIME_4_PLUME
+from parameters import INITIAL_TIME_4_PLUME, BACKGROUND_NOISE
+
+EARTH_RADIUS = 6378137.0  # Radius of "spherical" earth
+# pi as written in `measure_pollutant`: every reader of the plume uses it, so
+# the frames and the samples place the plume at the same cells
+PI = 3.14
+SAMPLING_METHODS = ("nearest", "time", "trilinear")
 
 
 class PollutantDistribution:
     """Distribution of pollutats in a 400x10x10 m^3 volume"""
 
-    def __init__(self, lat: float, lon: float):
+    def __init__(
+        self,
+        lat: float,
+        lon: float,
+        mmap_mode=None,
+        time_window=None,
+        heights=None,
+        dispersion=None,
+        seed=None,
+    ):
+        """`mmap_mode` maps the dataset instead of reading it (see
+        `numpy.load`). `time_window` = (first, last + 1) and `heights`
+        restrict the loaded data to the time and height indices that are going
+        to be sampled; only that window is read from disk, and the
+        `height`/`time` arguments of the measures keep being absolute
+        indices. A `dispersion` array (e.g. a `SharedArrays` view) is used
+        as the whole dataset without copying it. `seed` (an int, a
+        `SeedSequence` or a `Generator`) seeds `self.rng`, the generator of
+        the background noise. `signature` identifies the whole dataset (see
+        `dataset_signature`)."""
         file_path = "databases/plume_dispersion_real_wind.npy"
         coord_00 = (lat, lon)
-        self.dispersion = load_data(file_path)
-        x_dim, y_dim, _, _ = self.dispersion.shape
+        windowed = time_window is not None or heights is not None
+        if dispersion is not None:
+            self.dispersion = dispersion
+        else:
+            self.dispersion = load_data(
+                file_path, mmap_mode=mmap_mode or ("r" if windowed else None)
+            )
+        x_dim, y_dim, n_heights, n_times = self.dispersion.shape
+        self.signature = dataset_signature(
+            self.dispersion, file_path if dispersion is None else None
+        )
+        #
+        self.h_0, self.t_0 = 0, 0
+        if windowed:
+            h_0, h_1 = 0, n_heights
+            if heights is not None:
+                h_0, h_1 = min(heights), max(heights) + 1
+            t_0, t_1 = time_window if time_window else (0, n_times)
+            self.h_0, self.t_0 = h_0, t_0
+            self.dispersion = self.dispersion[:, :, h_0:h_1, t_0:t_1]
+            if mmap_mode is None and dispersion is None:
+                self.dispersion = array(self.dispersion)
+        #
+        self.rng = default_rng(seed)
         self.l_lat, self.l_lon = coord_00
         self.u_lat, self.u_lon = get_location_meters(coord_00, (y_dim, x_dim))
 
-    def measure_pollutant(self, position, height=5, time=0):
+    def measure_pollutant(self, position, height=5, time=0, rng=None):
         """Returns a sample from the simulated plume if the position is into
-        the plume simulation boundaries
+        the plume simulation boundaries, background noise from `rng` (or
+        `self.rng`) otherwise
         """
         lat, lon = split_gps(position)
         if (self.l_lon < lon < self.u_lon) and (self.l_lat < lat < self.u_lat):
@@ -33,12 +98,179 @@ class PollutantDistribution:
             x_index = saturate(x_index, 0, l_2 - 1)
             y_index = saturate(y_index, 0, l_1 - 1)
             #
+            height, time = self._window_index(height, time)
             return self.dispersion[y_index, x_index, height, time]
-        return random() * 0.009
+        rng = self.rng if rng is None else rng
+        return rng.random() * BACKGROUND_NOISE
+
+    def measure_frame(self, lats, lons, height=5, time=0, truth=None):
+        """Returns the samples of every (lat, lon) pair of the grid spanned by
+        the `lats` and `lons` vectors, as a (len(lons), len(lats)) array
+        indexed [x, y] like the measures layers of `CellMap`.
+
+        It follows the same rules than `measure_pollutant`, but the plume is
+        read with a single gather from `self.dispersion`. A `truth` frame
+        already computed by `truth_frame` is used instead of reading it.
+        """
+        if truth is None:
+            truth = self.truth_frame(lats, lons, height, time)
+        noise = self.rng.random(truth.shape) * BACKGROUND_NOISE
+        return where(isnan(truth), noise, truth)
+
+    def truth_frame(self, lats, lons, height=5, time=0):
+        """Returns the frame of `measure_frame` without the background noise
+        (NaN outside the plume)"""
+        x_index, inside_lat = self._lat_index(lats)
+        y_index, inside_lon = self._lon_index(lons)
+        height, time = self._window_index(height, time)
+        #
+        # the rows follow the longitudes (x) and the columns the latitudes
+        frame = self.dispersion[
+            y_index[:, newaxis], x_index[newaxis, :], height, time
+        ]
+        inside = inside_lon[:, newaxis] & inside_lat[newaxis, :]
+        return where(inside, frame, nan)
+
+    def window(self, lats, lons):
+        """Returns the slices of the `lons` (x) and of the `lats` (y), both
+        sorted, whose cells of the grid are into the plume"""
+        _, inside_lat = self._lat_index(lats)
+        _, inside_lon = self._lon_index(lons)
+        windows = []
+        for inside in (inside_lon, inside_lat):
+            cells = flatnonzero(inside)
+            if cells.size == 0:
+                windows.append(slice(0, 0))
+            else:
+                windows.append(slice(int(cells[0]), int(cells[-1]) + 1))
+        return tuple(windows)
+
+    def measure_points(self, lats, lons, height=5, time=0, rng=None):
+        """Returns the samples at the (lat, lon) points. The arguments are
+        broadcast together, so many points, heights and times are read with
+        a single gather. The background noise is drawn from `rng` (a
+        `numpy.random.Generator`) or `self.rng`."""
+        x_index, inside_lat = self._lat_index(lats)
+        y_index, inside_lon = self._lon_index(lons)
+        height, time = self._window_index(asarray(height), asarray(time))
+        #
+        samples = self.dispersion[y_index, x_index, height, time]
+        rng = self.rng if rng is None else rng
+        noise = rng.random(samples.shape) * BACKGROUND_NOISE
+        return where(inside_lat & inside_lon, samples, noise)
+
+    def sample(
+        self, lats, lons, alts=5, times=0, method="trilinear", rng=None
+    ):
+        """Returns the concentration at the (lat, lon, alt, time) points.
+
+        The arguments are broadcast together. The positions are placed in
+        the plume as in `measure_pollutant` (the cell i spans [i + 1, i + 2)
+        meters), `alts` are in meters (1 m layers) and `times` are absolute
+        seconds, that can be fractional. With "nearest" the closest cell is
+        read at the second in progress (as the frames), with "time" the
+        closest cell is interpolated linearly in time, and with "trilinear"
+        the values are interpolated in the three dimensions and in time.
+        Outside the plume the uniform background noise is drawn from `rng`
+        or `self.rng`.
+        """
+        if method not in SAMPLING_METHODS:
+            raise ValueError(
+                "The `method` argument must be: %s."
+                % ", ".join(SAMPLING_METHODS)
+            )
+        lats, lons, alts, times = broadcast_arrays(
+            *(
+                asarray(value, dtype=float)
+                for value in (lats, lons, alts, times)
+            )
+        )
+        x_dim, y_dim, n_heights, n_times = self.dispersion.shape
+        north, inside_lat = self._north(lats)
+        east, inside_lon = self._east(lons)
+        inside = inside_lat & inside_lon
+        if method == "nearest":
+            times = floor(times)
+        # raises IndexError out of the loaded window
+        self._window_index(rint(alts), floor(times))
+        #
+        space = method == "trilinear"
+        axes = [
+            _axis(east - 1.5, x_dim, space),
+            _axis(north - 1.5, y_dim, space),
+            _axis(alts - self.h_0, n_heights, space),
+            _axis(times - self.t_0, n_times, method != "nearest"),
+        ]
+        values = 0.0
+        for corner in product(*axes):
+            weight = 1.0
+            for _, corner_weight in corner:
+                weight = weight * corner_weight
+            index = tuple(corner_index for corner_index, _ in corner)
+            values = values + weight * self.dispersion[index]
+        #
+        rng = self.rng if rng is None else rng
+        noise = rng.random(lats.shape) * BACKGROUND_NOISE
+        return where(inside, values, noise)[()]
+
+    def _north(self, lats):
+        """Returns the meters from the plume origin of the latitudes (as in
+        `measure_pollutant`) and whether they are into the plume"""
+        lats = asarray(lats, dtype=float)
+        inside = (self.l_lat < lats) & (lats < self.u_lat)
+        return (lats - self.l_lat) * PI / 180 * EARTH_RADIUS, inside
+
+    def _east(self, lons):
+        """Returns the meters from the plume origin of the longitudes (as in
+        `measure_pollutant`) and whether they are into the plume"""
+        lons = asarray(lons, dtype=float)
+        inside = (self.l_lon < lons) & (lons < self.u_lon)
+        return (lons - self.l_lon) * PI / 180 * EARTH_RADIUS, inside
+
+    def _lat_index(self, lats):
+        """Returns the dispersion index of the latitudes (as in
+        `measure_pollutant`) and whether they are into the plume"""
+        _, l_2, _, _ = self.dispersion.shape
+        north, inside = self._north(lats)
+        return clip(north.astype(int) - 1, 0, l_2 - 1), inside
+
+    def _lon_index(self, lons):
+        """Returns the dispersion index of the longitudes (as in
+        `measure_pollutant`) and whether they are into the plume"""
+        l_1, _, _, _ = self.dispersion.shape
+        east, inside = self._east(lons)
+        return clip(east.astype(int) - 1, 0, l_1 - 1), inside
+
+    def _window_index(self, height, time):
+        """Translates absolute height and time indices to the loaded window"""
+        _, _, n_heights, n_times = self.dispersion.shape
+        height, time = height - self.h_0, time - self.t_0
+        if not (
+            0 <= amin(height)
+            and amax(height) < n_heights
+            and 0 <= amin(time)
+            and amax(time) < n_times
+        ):
+            raise IndexError(
+                "height %s and time %s are out of the loaded plume window"
+                % (height + self.h_0, time + self.t_0)
+            )
+        return height, time
 
     #
 
 
+def _axis(coordinate, n_cells: int, interpolate: bool) -> list:
+    """Returns the (index, weight) pairs to read the continuous `coordinate`
+    (in cells) along an axis of `n_cells`, clamped to the axis"""
+    if not interpolate:
+        return [(clip(rint(coordinate), 0, n_cells - 1).astype(int), 1.0)]
+    lower = clip(floor(coordinate), 0, n_cells - 1).astype(int)
+    upper = clip(lower + 1, 0, n_cells - 1)
+    weight = clip(coordinate - lower, 0, 1)
+    return [(lower, 1 - weight), (upper, weight)]
+
+
 if __name__ == "__main__":
     plume = PollutantDistribution(lat=25.645656, lon=-100.288479)
     print(plume.dispersion.shape)
@@ -0,0 +1,248 @@
+"""Store of the summaries of the experiments"""
+import argparse
+import csv
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from numpy import (
+    array,
+    concatenate,
+    float64,
+    int32,
+    isin,
+    isnan,
+    load as load_data,
+    nan,
+    savez,
+)
+from parameters import RESULTS_DIR
+
+# Columns of the summaries (`Simulation.summary`), in the order of the CSV
+FIELDNAMES = [
+    "source_pos_x",
+    "source_pos_y",
+    "source_lat",
+    "source_lon",
+    "source_alt",
+    "source_released_time",
+    "theshold_4_pollutant",
+    "termination_time",
+    "initial_height_1",
+    "initial_height_2",
+    "firstDV",
+    "firstDT",
+    "firstD_lat",
+    "firstD_lon",
+    "firstD_alt",
+    "firstD_x",
+    "firstD_y",
+    "firstD_uav",
+    "best_value",
+    "best_value_time",
+    "best_value_lat",
+    "best_value_lon",
+    "best_value_alt",
+    "best_value_x",
+    "best_value_y",
+    "dist_best2source",
+]
+
+# Columns that every summary has, the others may be None (stored as NaN)
+INTEGER_COLUMNS = (
+    "source_pos_x",
+    "source_pos_y",
+    "source_alt",
+    "source_released_time",
+    "termination_time",
+    "initial_height_1",
+    "initial_height_2",
+)
+
+
+class ResultsStore:
+    """Summaries of the experiments, in the directory `root`.
+
+    `add` writes every summary to its own JSON file in `root/runs` (written
+    to a temporary name and renamed), so any number of processes can add
+    runs at the same time. `compact` moves the runs into `root/table.npz`,
+    a table with a typed column per field (and the "run" name of each row)
+    that `load` reads in a few milliseconds. Compactions are serialised by
+    a lock file, and the runs already in the table are skipped, so an
+    interrupted compaction is simply done again.
+    """
+
+    def __init__(self, root: str = RESULTS_DIR):
+        self.root = root
+        self.runs_dir = os.path.join(root, "runs")
+        self.table_path = os.path.join(root, "table.npz")
+        os.makedirs(self.runs_dir, exist_ok=True)
+
+    def add(self, summary: dict) -> str:
+        """Save the summary of one experiment and returns its run name"""
+        run = "%i-%i-%s" % (time.time_ns(), os.getpid(), uuid.uuid4().hex[:8])
+        record = {key: _plain(value) for key, value in summary.items()}
+        path = os.path.join(self.runs_dir, run + ".json")
+        with open(path + ".tmp", "w") as my_file:
+            json.dump(record, my_file)
+        os.replace(path + ".tmp", path)
+        return run
+
+    def pending(self) -> list:
+        """Returns the names of the runs not compacted yet, in order"""
+        return sorted(
+            name[: -len(".json")]
+            for name in os.listdir(self.runs_dir)
+            if name.endswith(".json")
+        )
+
+    def _read_runs(self, runs) -> dict:
+        """Returns the columns of the JSON `runs`"""
+        records = []
+        for run in runs:
+            path = os.path.join(self.runs_dir, run + ".json")
+            with open(path) as my_file:
+                records.append(json.load(my_file))
+        return _columns(records, runs)
+
+    def _read_table(self) -> dict:
+        """Returns the columns of the compacted table"""
+        if not os.path.exists(self.table_path):
+            return _columns([], [])
+        with load_data(self.table_path) as table:
+            return {name: table[name] for name in table.files}
+
+    def load(self) -> dict:
+        """Returns every run, compacted or not, as a dict of columns"""
+        while True:
+            table = self._read_table()
+            compacted = set(table["run"].tolist())
+            runs = [run for run in self.pending() if run not in compacted]
+            if not runs:
+                return table
+            try:
+                return _concatenate(table, self._read_runs(runs))
+            except FileNotFoundError:
+                continue  # compacted meanwhile: read again the new table
+
+    def compact(self) -> int:
+        """Move the pending runs into the table. Returns their number"""
+        with self._lock():
+            table = self._read_table()
+            runs = self.pending()
+            compacted = set(table["run"].tolist())
+            new = [run for run in runs if run not in compacted]
+            if new:
+                table = _concatenate(table, self._read_runs(new))
+                temporary = self.table_path + ".tmp.npz"
+                savez(temporary, **table)
+                os.replace(temporary, self.table_path)
+            for run in runs:
+                os.remove(os.path.join(self.runs_dir, run + ".json"))
+        return len(new)
+
+    @contextmanager
+    def _lock(self, timeout: float = 60):
+        """Hold the compaction lock file"""
+        path = os.path.join(self.root, "compact.lock")
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                descriptor = os.open(path, os.O_CREAT | os.O_EXCL)
+                break
+            except FileExistsError:
+                if time.monotonic() > deadline:
+                    raise TimeoutError("%s is held by another process" % path)
+                time.sleep(0.05)
+        try:
+            yield
+        finally:
+            os.close(descriptor)
+            os.remove(path)
+
+    def import_csv(self, path: str) -> int:
+        """Add the rows of a CSV file written by older versions (with or
+        without a header). Returns the number of rows"""
+        with open(path, newline="") as my_file:
+            rows = list(csv.reader(my_file))
+        if rows and rows[0][0] == FIELDNAMES[0]:
+            rows = rows[1:]
+        for row in rows:
+            self.add(
+                {
+                    key: float(value) if value else None
+                    for key, value in zip(FIELDNAMES, row)
+                }
+            )
+        return len(rows)
+
+    def export_csv(self, path: str) -> int:
+        """Write every run, with a header, to a CSV file (e.g. for
+        statistical_graphs.R). Returns the number of rows"""
+        columns = self.load()
+        n_rows = len(columns["run"])
+        with open(path, "w") as my_file:
+            writer = csv.writer(my_file, lineterminator="\n")
+            writer.writerow(FIELDNAMES)
+            for index in range(n_rows):
+                writer.writerow(
+                    [_cell(columns[key][index]) for key in FIELDNAMES]
+                )
+        return n_rows
+
+
+def _plain(value):
+    """Returns a NumPy scalar as a Python one"""
+    return value.item() if hasattr(value, "item") else value
+
+
+def _columns(records, runs) -> dict:
+    """Returns the typed columns of the summaries `records`"""
+    columns = {"run": array(runs, dtype=str)}
+    for key in FIELDNAMES:
+        values = [record.get(key) for record in records]
+        if key in INTEGER_COLUMNS:
+            columns[key] = array(values, dtype=int32)
+        else:
+            columns[key] = array(
+                [nan if value is None else value for value in values],
+                dtype=float64,
+            )
+    return columns
+
+
+def _concatenate(first: dict, second: dict) -> dict:
+    """Returns the rows of `first` followed by those of `second` not in it"""
+    keep = ~isin(second["run"], first["run"])
+    return {
+        name: concatenate((first[name], second[name][keep]))
+        for name in first
+    }
+
+
+def _cell(value) -> str:
+    """Returns a value as a CSV cell (empty for the missing ones)"""
+    value = _plain(value)
+    if isinstance(value, float):
+        if isnan(value):
+            return ""
+        if value.is_integer():
+            return str(int(value))
+    return str(value)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--results", default=RESULTS_DIR)
+    parser.add_argument("--import-csv", default=None)
+    parser.add_argument("--csv", default=None, help="export the runs there")
+    args = parser.parse_args()
+    #
+    store = ResultsStore(args.results)
+    if args.import_csv:
+        print("%i runs imported" % store.import_csv(args.import_csv))
+    print("%i runs compacted" % store.compact())
+    if args.csv:
+        rows = store.export_csv(args.csv)
+        print("%i runs exported to %s" % (rows, args.csv))
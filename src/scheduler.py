@@ -0,0 +1,133 @@
+"""Pacing of the control loop"""
+from math import floor, sqrt
+from time import monotonic, sleep
+
+POLICIES = ("skip", "catch_up", "degrade")
+
+
+class FixedRateScheduler:
+    """Paces a loop at `rate` ticks per second against monotonic deadlines.
+
+    Deadlines are multiples of the period from `start`, so the sleeps do not
+    accumulate drift. When a tick overruns its deadline the `policy` says
+    what to do:
+
+    - "skip": the missed deadlines are dropped and `wait` returns the number
+      of periods elapsed, so the simulated time keeps up with the wall clock.
+    - "catch_up": the missed ticks run back to back without sleeping.
+    - "degrade": as "catch_up", but `degraded` is set while the loop is late
+      so optional work (plotting, ground-truth frames) can be dropped.
+
+    Without `realtime` the scheduler never sleeps and every tick advances one
+    period, as fast as the CPU allows.
+    """
+
+    def __init__(
+        self,
+        rate: float = 1.0,
+        policy: str = "skip",
+        realtime: bool = True,
+        clock=monotonic,
+        sleeper=sleep,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(
+                "The `policy` argument must be: %s." % ", ".join(POLICIES)
+            )
+        period = 1.0 / rate
+        # integer periods keep the simulated times integers
+        self.period = int(period) if period.is_integer() else period
+        self.rate = rate
+        self.policy = policy
+        self.realtime = realtime
+        self.clock = clock
+        self.sleeper = sleeper
+        self.degraded = False
+        self.next_deadline = None
+        #
+        self.ticks = 0
+        self.overruns = 0
+        self.skipped = 0
+        self._jitter_count = 0
+        self._jitter_sum = 0.0
+        self._jitter_sq_sum = 0.0
+        self._jitter_max = 0.0
+
+    def start(self) -> None:
+        """Set the deadline of the first tick"""
+        self.next_deadline = self.clock() + self.period
+
+    def wait(self) -> int:
+        """Wait for the end of the current tick. Returns the number of periods
+        the simulated time has to advance"""
+        self.ticks += 1
+        if not self.realtime:
+            return 1
+        if self.next_deadline is None:
+            self.start()
+        #
+        late = self.clock() - self.next_deadline
+        if late < 0:
+            self.sleeper(-late)
+            self._add_jitter(self.clock() - self.next_deadline)
+            self.next_deadline += self.period
+            self.degraded = False
+            return 1
+        #
+        self.overruns += 1
+        self._add_jitter(late)
+        missed = int(late // self.period)
+        if self.policy == "skip":
+            self.skipped += missed
+            self.next_deadline += (missed + 1) * self.period
+            return missed + 1
+        self.next_deadline += self.period
+        self.degraded = self.policy == "degrade" and missed > 0
+        return 1
+
+    def time(self, periods: int):
+        """Returns the simulated time after `periods` periods. It is
+        computed from the count, not summed, so the whole seconds are exact
+        (and ints)"""
+        time = periods / self.rate
+        return int(time) if float(time).is_integer() else time
+
+    def _add_jitter(self, jitter: float) -> None:
+        """Record the lateness of a wake up"""
+        self._jitter_count += 1
+        self._jitter_sum += jitter
+        self._jitter_sq_sum += jitter * jitter
+        self._jitter_max = max(self._jitter_max, abs(jitter))
+
+    def stats(self) -> dict:
+        """Returns the statistics of the pacing"""
+        count = self._jitter_count
+        mean = self._jitter_sum / count if count else 0.0
+        variance = self._jitter_sq_sum / count - mean * mean if count else 0.0
+        return {
+            "rate": self.rate,
+            "policy": self.policy,
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+            "jitter_mean": mean,
+            "jitter_std": sqrt(max(variance, 0.0)),
+            "jitter_max": self._jitter_max,
+        }
+
+
+class SubRate:
+    """Fires at `rate` Hz inside a loop that ticks at `base_rate` Hz"""
+
+    def __init__(self, rate: float, base_rate: float):
+        self.ratio = min(rate / base_rate, 1.0)
+        self._phase = 1.0  # fire on the first tick
+
+    def due(self, ticks: int = 1) -> bool:
+        """Advance `ticks` loop ticks and returns if the task has to run"""
+        if self._phase >= 1.0 - 1e-9:
+            self._phase -= floor(self._phase + 1e-9)
+            self._phase += self.ratio * ticks
+            return True
+        self._phase += self.ratio * ticks
+        return False
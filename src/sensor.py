@@ -0,0 +1,69 @@
+"""Sensor that samples the plume along the path flown by a UAV"""
+from numpy import arange, argmax, column_stack
+from parameters import SENSOR_RATE, SAMPLING_METHOD, LOWEST_HEIGHT
+
+
+class PathSensor:
+    """Samples the plume at `rate` Hz along the segment flown by each UAV
+    since its previous measure.
+
+    The points are spread evenly in space and time on the straight line
+    between the previous and the current location (the current one
+    included), sampled from `plume` at once with `method` (see
+    `PollutantDistribution.sample`) and written in the measures of
+    `reference_map`.
+    """
+
+    def __init__(
+        self,
+        plume,
+        reference_map,
+        rate: float = SENSOR_RATE,
+        method: str = SAMPLING_METHOD,
+    ):
+        self.plume = plume
+        self.reference_map = reference_map
+        self.rate = rate
+        self.method = method
+        self._previous = {}  # uav id: (time, lat, lon)
+
+    def sample(
+        self, uav_id: int, location, height, time, now: float, rng=None
+    ):
+        """Measure the segment of UAV `uav_id` that ends at `location` at the
+        simulated time `now`, at `height` and at the plume `time` (in
+        seconds, fractional as `now`) of the end of the segment. The noise is drawn from `rng` (by
+        default the generator of the plume).
+
+        Returns the (lat, lon) rows, the (x, y) cells and the values of the
+        samples, the last one being the current location.
+        """
+        lat, lon = location.lat, location.lon
+        previous = self._previous.get(uav_id)
+        self._previous[uav_id] = (now, lat, lon)
+        if previous is None:
+            n_samples = 1
+            previous = (now, lat, lon)
+        else:
+            n_samples = max(int(round((now - previous[0]) * self.rate)), 1)
+        #
+        fraction = arange(1, n_samples + 1) / n_samples
+        lats = previous[1] + fraction * (lat - previous[1])
+        lons = previous[2] + fraction * (lon - previous[2])
+        times = time - (1 - fraction) * (now - previous[0])
+        values = self.plume.sample(
+            lats, lons, height, times, method=self.method, rng=rng
+        )
+        #
+        points = column_stack((lats, lons))
+        cells = self.reference_map.gps2cell(points)
+        self.reference_map.set_samples(
+            cells[:, 0], cells[:, 1], values, int(height) - LOWEST_HEIGHT
+        )
+        return points, cells, values
+
+    @staticmethod
+    def best(points, cells, values):
+        """Returns the (value, (lat, lon), (x, y)) of the highest sample"""
+        index = argmax(values)
+        return values[index], points[index], cells[index]
@@ -0,0 +1,77 @@
+"""Arrays published once in shared memory and attached by many processes"""
+from multiprocessing import shared_memory
+from numpy import dtype as np_dtype, ndarray
+
+
+class SharedArrays:
+    """Named NumPy arrays stored in `multiprocessing.shared_memory` blocks.
+
+    The process that `publish`es the arrays owns the blocks and unlinks them
+    on `close`. The other processes `attach` to them from the picklable
+    `spec` and get zero-copy, read-only views.
+    """
+
+    def __init__(self, blocks: dict, spec: dict, owner: bool):
+        self._blocks = blocks
+        self.spec = spec
+        self.owner = owner
+        self.arrays = {}
+        for name, (_, shape, type_str) in spec.items():
+            array = ndarray(
+                shape, dtype=np_dtype(type_str), buffer=blocks[name].buf
+            )
+            if not owner:
+                array.flags.writeable = False
+            self.arrays[name] = array
+
+    @classmethod
+    def publish(cls, **arrays) -> "SharedArrays":
+        """Copy the `arrays` into new shared memory blocks"""
+        blocks, spec = {}, {}
+        for name, array in arrays.items():
+            block = shared_memory.SharedMemory(
+                create=True, size=max(array.nbytes, 1)
+            )
+            blocks[name] = block
+            spec[name] = (block.name, array.shape, array.dtype.str)
+        shared = cls(blocks, spec, owner=True)
+        for name, array in arrays.items():
+            shared.arrays[name][...] = array
+        return shared
+
+    @classmethod
+    def attach(cls, spec: dict) -> "SharedArrays":
+        """Map the blocks published by another process"""
+        blocks = {
+            name: shared_memory.SharedMemory(name=block_name)
+            for name, (block_name, _, _) in spec.items()
+        }
+        return cls(blocks, spec, owner=False)
+
+    def __getitem__(self, name: str):
+        return self.arrays[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.arrays
+
+    def get(self, name: str, default=None):
+        """Returns the array `name`, or `default` if it was not published"""
+        return self.arrays.get(name, default)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self) -> None:
+        """Drop the views and the blocks (unlinked if this is the owner)"""
+        self.arrays = {}
+        for block in self._blocks.values():
+            try:
+                block.close()
+            except BufferError:
+                pass  # released when the remaining views are collected
+            if self.owner:
+                block.unlink()
+        self._blocks = {}
@@ -0,0 +1,34 @@
+"""Best measure found by the UAVs of one mission"""
+from threading import Lock
+
+
+class SharedBest:
+    """The fitness (best measure) of a mission and the cell where it was
+    taken, shared by the pilots of the mission.
+
+    `offer` compares and updates both under a lock, so the pilots of one
+    mission can run in parallel threads, and every mission of the process
+    has its own instance.
+    """
+
+    def __init__(self, value: float = -float("inf"), position=(50, 50)):
+        self._lock = Lock()
+        self.value = value
+        self.position = list(position)
+
+    def offer(
+        self, value: float, position, threshold: float = -float("inf")
+    ) -> bool:
+        """Keep `value` and `position` if `value` is above the current best
+        and the `threshold`. Returns if they were kept"""
+        with self._lock:
+            if self.value < value > threshold:
+                self.value = value
+                self.position = list(position)
+                return True
+            return False
+
+    def get(self):
+        """Returns a consistent (value, position) pair"""
+        with self._lock:
+            return self.value, self.position
@@ -0,0 +1,522 @@
+"""One experiment of the source localization"""
+from functools import partial
+from concurrent.futures.thread import ThreadPoolExecutor
+from threading import Lock
+from numpy.random import SeedSequence, default_rng
+from cellmap import CellMap
+from tiledmap import TiledCellMap
+from pollutant import PollutantDistribution
+from fleet import Fleet
+from shared_best import SharedBest
+from sensor import PathSensor
+from framecache import default_cache, grid_signature
+from instrumentation import Instrumentation
+from scheduler import FixedRateScheduler, SubRate
+from utils import get_location_meters, get_distance_metres
+from parameters import (
+    CELL_PARAMETERS,
+    X0_Y0_PLUME_COORD,
+    SIMULATION_TIME,
+    HEIGHTS_UAV,
+    PARTITION,
+    POLLUTANT_THRESHOLD,
+    STAGE,
+    INITIAL_TIME_4_PLUME,
+    TICK_RATE,
+    OVERRUN_POLICY,
+    SENSING_RATE,
+    COMMAND_RATE,
+    SENSOR_RATE,
+    TILED_MAP,
+    VERBOSITY,
+    LOWEST_HEIGHT,
+)
+
+
+def layer(height) -> int:
+    """Returns the measures layer of the map of the samples and of the
+    ground truth at `height`"""
+    return int(height) - LOWEST_HEIGHT
+
+
+class Simulation:
+    """A fleet of UAVs looking for the source of the plume at `plume_pos`.
+
+    There is one UAV per entry of `heights`, taking off from the cells of
+    `locations` and exploring the parts of the map given by `partition`
+    (see `fleet.Fleet`).
+
+    With `headless` the vehicles are in-process kinematic models advanced as
+    fast as possible, otherwise they are SITL/MAVLink vehicles flown in real
+    time. `seed` (an int or a `SeedSequence`) is the root of the independent
+    generators of the plume, of the measures of every UAV and of every
+    pilot, so a run can be reproduced, even with concurrent UAVs.
+    `shared` optionally provides the "dispersion", "wind_x" and "wind_y"
+    arrays (e.g. a `SharedArrays`) instead of loading them from disk.
+    The loop is paced by `self.scheduler` at `rate` Hz with the overrun
+    `policy`, and each UAV measures and is commanded at its own sub-rate
+    (SENSING_RATE and COMMAND_RATE). With a `sensor_rate` above `rate` each
+    measure samples the whole path flown since the previous one. The
+    ground-truth frames come from `frame_cache` (by default the cache shared
+    by the experiments of the process). With `tiled` the map is a
+    `TiledCellMap`. The state of every UAV at every tick is written to
+    `telemetry` (a `TelemetryLog`) if given, and `verbosity` selects the
+    prints (0: none, 1: the detections, 2: also every command). With
+    `concurrent` (the default unless
+    `headless`) the UAVs measure and are commanded in parallel by a
+    persistent thread pool, so a tick lasts as long as the slowest UAV; the
+    writes to the map hold its semaphore and the summaries are updated
+    under `self.lock`. The phases of every tick
+    are timed by `self.instrumentation`.
+    """
+
+    def __init__(
+        self,
+        plume_pos: int,
+        heights=HEIGHTS_UAV,
+        headless: bool = False,
+        seed=None,
+        shared=None,
+        profile: bool = False,
+        rate: float = TICK_RATE,
+        policy: str = OVERRUN_POLICY,
+        concurrent=None,
+        locations=None,
+        partition: str = PARTITION,
+        sensor_rate: float = SENSOR_RATE,
+        frame_cache=None,
+        tiled: bool = TILED_MAP,
+        telemetry=None,
+        verbosity: int = VERBOSITY,
+    ):
+        if min(heights) < LOWEST_HEIGHT:
+            raise ValueError("The UAVs fly at %i m or higher" % LOWEST_HEIGHT)
+        self.heights = heights
+        self.locations = locations
+        self.partition = partition
+        self.headless = headless
+        # the headless runs stay sequential to be reproducible
+        self.concurrent = not headless if concurrent is None else concurrent
+        self.lock = Lock()
+        self.seed = seed
+        seeds = seed if isinstance(seed, SeedSequence) else SeedSequence(seed)
+        plume_seed, measures_seed, pilots_seed = seeds.spawn(3)
+        self.measures_rngs = [
+            default_rng(child) for child in measures_seed.spawn(len(heights))
+        ]
+        self.pilots_rngs = [
+            default_rng(child) for child in pilots_seed.spawn(len(heights))
+        ]
+        self.stage = STAGE
+        self.current_time = 0
+        self.periods = 0  # of the scheduler, the clock of `current_time`
+        self.graph = None
+        self.telemetry = telemetry
+        self.verbosity = verbosity
+        self.scheduler = FixedRateScheduler(
+            rate=rate, policy=policy, realtime=not headless
+        )
+        self.sensing = [
+            SubRate(SENSING_RATE[index % len(SENSING_RATE)], rate)
+            for index in range(len(heights))
+        ]
+        self.commanding = [
+            SubRate(COMMAND_RATE[index % len(COMMAND_RATE)], rate)
+            for index in range(len(heights))
+        ]
+        self.last_measures = {}
+        self.instrumentation = Instrumentation(
+            budget=self.scheduler.period, profile=profile
+        )
+        self.instrumentation.context["scheduler"] = self.scheduler.stats
+        #
+        # Summary parameters
+        self.first_detection = {
+            "value": None,
+            "time": None,
+            "lat": None,
+            "lon": None,
+            "alt": None,
+            "x": None,
+            "y": None,
+            "uav": None,
+        }
+        self.best = {
+            "value": None,
+            "value_time": None,
+            "value_lat": None,
+            "value_lon": None,
+            "value_alt": None,
+            "value_x": None,
+            "value_y": None,
+            "dist2source": None,
+        }
+        #
+        # Create the probability map
+        shared = shared if shared is not None else {}
+        map_class = TiledCellMap if tiled else CellMap
+        self.reference_map = map_class(
+            **CELL_PARAMETERS,
+            # a layer per height, see `layer`
+            layers=max(4, max(heights) - LOWEST_HEIGHT + 1),
+            wind_x=shared.get("wind_x"),
+            wind_y=shared.get("wind_y"),
+        )
+        #
+        # Instance the plume
+        plume_location = self.reference_map.cell2gps(
+            X0_Y0_PLUME_COORD[plume_pos]
+        )
+        self.source_gps = get_location_meters(plume_location, [4, 4])
+        self.plume = PollutantDistribution(
+            *plume_location,
+            mmap_mode="r",
+            time_window=(
+                INITIAL_TIME_4_PLUME - 1,
+                INITIAL_TIME_4_PLUME + SIMULATION_TIME - 1,
+            ),
+            heights=heights,
+            dispersion=shared.get("dispersion"),
+            seed=plume_seed,
+        )
+        #
+        self.frame_cache = frame_cache or default_cache()
+        self.instrumentation.context["frame_cache"] = self.frame_cache.stats
+        # The frames span the whole map, or in a tiled map only the window
+        # of the cells into the plume (the others are background)
+        lats, lons = self.reference_map.y_lat, self.reference_map.x_lon
+        self._frame_window = (slice(0, lons.size), slice(0, lats.size))
+        if tiled:
+            self._frame_window = self.plume.window(lats, lons)
+        x_window, y_window = self._frame_window
+        self._grid = grid_signature(lats[y_window], lons[x_window])
+        self.sensor = None
+        if sensor_rate > rate:
+            self.sensor = PathSensor(
+                self.plume, self.reference_map, rate=sensor_rate
+            )
+        #
+        # Simulation zone of the plume
+        self.lower_x, self.lower_y = self.reference_map.gps2cell(
+            (self.plume.l_lat, self.plume.l_lon)
+        )
+        self.upper_x, self.upper_y = self.reference_map.gps2cell(
+            (self.plume.u_lat, self.plume.u_lon)
+        )
+
+    def take_measure_and_move(
+        self, auto_piloto, sense: bool = True, command: bool = True
+    ) -> None:
+        """Both UAVs need to take a measure from the same plume and save it in
+        the map. Afer that, they must go towards their destination"""
+        if sense:
+            self.take_measure(auto_piloto)
+        if command:
+            self.move(auto_piloto)
+        if self.telemetry is not None and (sense or command):
+            self.record(auto_piloto)
+
+    def record(self, auto_piloto) -> None:
+        """Write the state of the UAV in the telemetry"""
+        vehicle = auto_piloto.vehicle
+        pollutant, cell, gps_location = self.last_measures[vehicle.id]
+        self.telemetry.record(
+            self.current_time,
+            vehicle.id,
+            gps_location,
+            vehicle.alt,
+            cell,
+            pollutant,
+            auto_piloto.destination_on_the_map,
+            *auto_piloto.best.get(),
+        )
+
+    def take_measure(self, auto_piloto) -> None:
+        """Measure the plume at the UAV position, save it in the map and
+        update the fitness"""
+        #
+        reference_map = self.reference_map
+        #
+        plume_time = self.current_time + INITIAL_TIME_4_PLUME - 1
+        curt = int(plume_time)
+        gps_location = auto_piloto.vehicle.location()
+        map_x, map_y = reference_map.gps2cell(gps_location)
+        auto_piloto.update_position((map_x, map_y))
+        if self.sensor is None:
+            pollutant = self.plume.measure_pollutant(
+                gps_location,
+                height=auto_piloto.vehicle.alt,
+                time=curt,
+                rng=self.measures_rngs[auto_piloto.vehicle.id - 1],
+            )
+            reference_map.set_sample(
+                map_x, map_y, pollutant, layer(auto_piloto.vehicle.alt)
+            )
+            best_sample = (
+                pollutant,
+                (gps_location.lat, gps_location.lon),
+                (map_x, map_y),
+            )
+        else:
+            samples = self.sensor.sample(
+                auto_piloto.vehicle.id,
+                gps_location,
+                auto_piloto.vehicle.alt,
+                plume_time,
+                self.current_time,
+                rng=self.measures_rngs[auto_piloto.vehicle.id - 1],
+            )
+            pollutant = samples[2][-1]
+            best_sample = self.sensor.best(*samples)
+        #
+        aux_position = (map_x, map_y)
+        self.last_measures[auto_piloto.vehicle.id] = (
+            pollutant,
+            aux_position,
+            gps_location,
+        )
+        #
+        with self.lock:
+            self._update_summaries(auto_piloto, *best_sample)
+
+    def _update_summaries(self, auto_piloto, pollutant, gps_point, cell):
+        """Update the fitness, the best and the first detection with the
+        measure `pollutant` taken at `gps_point` in the map `cell` (called
+        with `self.lock` held)"""
+        best = self.best
+        first_detection = self.first_detection
+        map_x, map_y = cell
+        lat, lon = gps_point
+        #
+        if auto_piloto.best.offer(
+            pollutant, [map_x, map_y], POLLUTANT_THRESHOLD
+        ):
+            self.stage = "exploitation"
+            auto_piloto.target_distance = 10000
+            #
+            best["value"] = pollutant
+            best["value_time"] = self.current_time
+            best["value_lat"] = lat
+            best["value_lon"] = lon
+            best["value_alt"] = auto_piloto.vehicle.alt
+            best["value_x"] = map_x
+            best["value_y"] = map_y
+            best["dist2source"] = get_distance_metres(
+                [lat, lon], self.source_gps
+            )
+            #
+            if self.verbosity > 0:
+                print("")
+                print(
+                    "fitness  time   lattitude   longitude   alt x   y  "
+                    "distance  UAV"
+                )
+                print(
+                    "{0:.4f}   {1}    {2:.6f}  {3:.6f}  {4}  {5}  {6}  "
+                    "{7:.2}   {8}   \n\n".format(
+                        best["value"],
+                        best["value_time"],
+                        best["value_lat"],
+                        best["value_lon"],
+                        best["value_alt"],
+                        best["value_x"],
+                        best["value_y"],
+                        best["dist2source"],
+                        auto_piloto.vehicle.id,
+                    )
+                )
+            #
+            if not first_detection["value"]:
+                first_detection["value"] = pollutant
+                first_detection["time"] = self.current_time
+                first_detection["lat"] = lat
+                first_detection["lon"] = lon
+                first_detection["alt"] = auto_piloto.vehicle.alt
+                first_detection["x"] = map_x
+                first_detection["y"] = map_y
+                first_detection["uav"] = auto_piloto.vehicle.id
+
+    def move(self, auto_piloto) -> None:
+        """Select the destination of the UAV from its last measure and send
+        it there"""
+        reference_map = self.reference_map
+        pollutant, aux_position, _ = self.last_measures[
+            auto_piloto.vehicle.id
+        ]
+        map_x, map_y = aux_position
+        #
+        auto_piloto.select_map_destination(
+            limits=reference_map.size(),
+            leader_position=aux_position,
+            measure=pollutant,
+        )
+        new_gps_position = reference_map.cell2gps(
+            auto_piloto.destination_on_the_map
+        )
+        auto_piloto.set_gps_destination(gps_point=new_gps_position)
+        #
+        if self.verbosity > 1:
+            # a single print keeps the lines of concurrent UAVs apart
+            print(
+                "UAV{0}: pollutant = {1:.4f}  time {2}  "
+                "location: ({3},{4})  destiny: {5}  fitness = {6:.4f}  "
+                "fit_pos = {7}  ".format(
+                    auto_piloto.vehicle.id,
+                    pollutant,
+                    self.current_time,
+                    map_x,
+                    map_y,
+                    auto_piloto.destination_on_the_map,
+                    *auto_piloto.best.get(),
+                )
+            )
+        #
+        with self.instrumentation.phase(
+            "mavlink%i" % auto_piloto.vehicle.id
+        ):
+            auto_piloto.go_to_destination()
+
+    def uav_tick(self, auto_piloto, sense: bool, command: bool) -> None:
+        """The work of one UAV during a tick"""
+        with self.instrumentation.phase("uav%i" % auto_piloto.vehicle.id):
+            self.take_measure_and_move(auto_piloto, sense, command)
+
+    def show_plume_in_map(self) -> None:
+        """Write the ground truth of the plume at the UAVs heights (with
+        the background noise, unless the map is tiled: then only the window
+        of the plume is written)"""
+        curt = int(self.current_time) + INITIAL_TIME_4_PLUME - 1
+        reference_map = self.reference_map
+        x_window, y_window = self._frame_window
+        lats = reference_map.y_lat[y_window]
+        lons = reference_map.x_lon[x_window]
+        origin = (self.plume.l_lat, self.plume.l_lon)
+        for height in sorted(set(self.heights)):
+            truth = self.frame_cache.get(
+                (origin, height, curt, self._grid, self.plume.signature),
+                partial(self.plume.truth_frame, lats, lons, height, curt),
+            )
+            frame = truth
+            if not isinstance(reference_map, TiledCellMap):
+                # in a tiled map the background noise would allocate every
+                # tile, so it stays at the fill of the layer
+                frame = self.plume.measure_frame(lats, lons, truth=truth)
+            reference_map.set_frame(
+                frame, layer(height), (x_window.start, y_window.start)
+            )
+
+    def run(self) -> dict:
+        """Fly the whole experiment and returns its summary"""
+        if self.headless:
+            from kinematic import KinematicVehicle as Vehicle
+        else:
+            from quadcopter import Vehicle
+        #
+        fleet = Fleet(
+            Vehicle,
+            self.reference_map,
+            locations=self.locations,
+            heights=self.heights,
+            partition=self.partition,
+            best=SharedBest(),
+            rngs=self.pilots_rngs,
+        )
+        executor = ThreadPoolExecutor(max_workers=len(self.heights))
+        with fleet, executor:
+            fleet.takeoff(executor)
+            self.fly(fleet, executor if self.concurrent else None)
+        #
+        return self.summary()
+
+    def fly(self, fleet, executor=None) -> None:
+        """Control loop of the mission. The UAVs run in `executor` if given,
+        one after the other otherwise"""
+        pilots = fleet.pilots
+        instrumentation = self.instrumentation
+        scheduler = self.scheduler
+        instrumentation.start()
+        scheduler.start()
+        elapsed = 1
+        while self.current_time < SIMULATION_TIME:
+            instrumentation.start_tick()
+            if not scheduler.degraded:
+                with instrumentation.phase("frame"):
+                    self.show_plume_in_map()
+            #
+            tasks = [
+                (
+                    pilot,
+                    self.sensing[index].due(elapsed),
+                    self.commanding[index].due(elapsed),
+                )
+                for index, pilot in enumerate(pilots)
+            ]
+            with instrumentation.phase("uavs"):
+                if executor is None:
+                    for task in tasks:
+                        self.uav_tick(*task)
+                else:
+                    futures = [
+                        executor.submit(self.uav_tick, *task) for task in tasks
+                    ]
+                    for future in futures:
+                        future.result()
+            #
+            if self.graph is not None and not scheduler.degraded:
+                with instrumentation.phase("plot"):
+                    self.graph.plot(
+                        map=self.reference_map,
+                        pilots=pilots,
+                        lower_lon=self.lower_x,
+                        lower_lat=self.lower_y,
+                        upper_lon=self.upper_x,
+                        upper_lat=self.upper_y,
+                        time=self.current_time,
+                    )
+            #
+            if self.stage == "exploitation":
+                fleet.set_stage("exploitation")
+
+            instrumentation.end_tick()
+            elapsed = scheduler.wait()
+            self.periods += elapsed
+            previous_time = self.current_time
+            self.current_time = scheduler.time(self.periods)
+            if self.headless:
+                fleet.step(self.current_time - previous_time)
+        instrumentation.stop()
+
+    def summary(self) -> dict:
+        """Returns the row of the experiment for the results database"""
+        reference_map = self.reference_map
+        first_detection = self.first_detection
+        best = self.best
+        return {
+            "source_pos_x": reference_map.gps2cell(self.source_gps)[0],
+            "source_pos_y": reference_map.gps2cell(self.source_gps)[1],
+            "source_lat": self.source_gps[0],
+            "source_lon": self.source_gps[1],
+            "source_alt": 3,
+            "source_released_time": INITIAL_TIME_4_PLUME,
+            "theshold_4_pollutant": POLLUTANT_THRESHOLD,
+            "termination_time": SIMULATION_TIME,
+            "initial_height_1": self.heights[0],
+            "initial_height_2": self.heights[-1],
+            "firstDV": first_detection["value"],
+            "firstDT": first_detection["time"],
+            "firstD_lat": first_detection["lat"],
+            "firstD_lon": first_detection["lon"],
+            "firstD_alt": first_detection["alt"],
+            "firstD_x": first_detection["x"],
+            "firstD_y": first_detection["y"],
+            "firstD_uav": first_detection["uav"],
+            "best_value": best["value"],
+            "best_value_time": best["value_time"],
+            "best_value_lat": best["value_lat"],
+            "best_value_lon": best["value_lon"],
+            "best_value_alt": best["value_alt"],
+            "best_value_x": best["value_x"],
+            "best_value_y": best["value_y"],
+            "dist_best2source": best["dist2source"],
+        }
+
@@ -0,0 +1,184 @@
+"""Run grids of headless experiments in parallel"""
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from numpy import load as load_data
+from numpy.random import SeedSequence
+from shared_arrays import SharedArrays
+from simulation import Simulation
+from results import ResultsStore
+from framecache import default_cache
+from parameters import (
+    X0_Y0_PLUME_COORD,
+    HEIGHTS_UAV,
+    FRAME_CACHE_DIR,
+    RESULTS_DIR,
+)
+
+
+def sweep_tasks(expes, plume_positions, heights, seeds) -> list:
+    """Returns one task per combination of the grid. The `SeedSequence` of
+    each task only depends on its parameters, so the results do not depend
+    on the worker that runs it, and the runs never share a stream"""
+    tasks = []
+    for expe, plume_pos, fleet, seed in itertools.product(
+        expes, plume_positions, heights, seeds
+    ):
+        entropy = [seed, expe, plume_pos, *fleet]
+        tasks.append(
+            {
+                "expe": expe,
+                "plume_pos": plume_pos,
+                "heights": tuple(fleet),
+                "seed": SeedSequence(entropy),
+            }
+        )
+    return tasks
+
+
+# Datasets attached by the worker, see `publish_datasets`
+_SHARED = None
+
+
+def publish_datasets() -> SharedArrays:
+    """Publish the plume cube and the wind series in shared memory, so every
+    worker uses the same copy instead of loading its own"""
+    return SharedArrays.publish(
+        dispersion=load_data(
+            "databases/plume_dispersion_real_wind.npy", mmap_mode="r"
+        ),
+        wind_x=load_data("databases/wind_x.npy"),
+        wind_y=load_data("databases/wind_y.npy"),
+    )
+
+
+def _attach_datasets(spec) -> None:
+    """Initializer of the workers of a sweep with shared datasets"""
+    global _SHARED
+    _SHARED = SharedArrays.attach(spec)
+
+
+def run_task(task: dict) -> dict:
+    """Run one experiment in a worker and returns its summary"""
+    simulation = Simulation(
+        task["plume_pos"],
+        heights=task["heights"],
+        headless=True,
+        seed=task["seed"],
+        shared=_SHARED,
+        frame_cache=default_cache(task.get("frame_cache", FRAME_CACHE_DIR)),
+        verbosity=0,
+    )
+    return simulation.run()
+
+
+def run_sweep(
+    tasks,
+    workers=None,
+    results=RESULTS_DIR,
+    shared=False,
+    frame_cache=FRAME_CACHE_DIR,
+    callback=None,
+) -> int:
+    """Run the `tasks` on a pool of `workers` processes. The summary of every
+    experiment is added to the `results` store as soon as it finishes. With
+    `shared` the datasets are published once in shared memory for all the
+    workers. The ground-truth frames computed by a worker are spilled to the
+    `frame_cache` directory, where the other workers find them. `callback`
+    is called with every summary (e.g. to watch the statistics converge).
+    Returns the number of experiments"""
+    tasks = [dict(task, frame_cache=frame_cache) for task in tasks]
+    datasets = publish_datasets() if shared else None
+    initializer = _attach_datasets if shared else None
+    initargs = (datasets.spec,) if shared else ()
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=initializer, initargs=initargs
+        ) as executor:
+            futures = [executor.submit(run_task, task) for task in tasks]
+            store = ResultsStore(results)
+            for future in as_completed(futures):
+                summary = future.result()
+                store.add(summary)
+                if callback is not None:
+                    callback(summary)
+    finally:
+        if datasets is not None:
+            datasets.close()
+    return len(futures)
+
+
+def non_negative(text: str) -> int:
+    """`type` of the arguments that seed the tasks (`SeedSequence` only
+    takes non-negative entropy)"""
+    value = int(text)
+    if value < 0:
+        raise argparse.ArgumentTypeError("%s is negative" % text)
+    return value
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--expes", type=non_negative, nargs="+", default=[0])
+    parser.add_argument(
+        "--plume-pos",
+        type=non_negative,
+        nargs="+",
+        default=list(range(len(X0_Y0_PLUME_COORD))),
+    )
+    parser.add_argument(
+        "--heights",
+        nargs="+",
+        default=[",".join(str(h) for h in HEIGHTS_UAV)],
+        help="heights of the UAVs of a fleet as h1,h2,... lists",
+    )
+    parser.add_argument("--seeds", type=non_negative, nargs="+", default=[0])
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--results", default=RESULTS_DIR)
+    parser.add_argument(
+        "--shared",
+        action="store_true",
+        help="share one copy of the datasets between the workers",
+    )
+    parser.add_argument(
+        "--frame-cache",
+        default=FRAME_CACHE_DIR,
+        help="directory where the ground-truth frames are spilled",
+    )
+    parser.add_argument(
+        "--watch",
+        type=int,
+        default=0,
+        help="print the statistics of the groups every WATCH experiments",
+    )
+    args = parser.parse_args()
+    #
+    try:
+        heights = [
+            [non_negative(h) for h in fleet.split(",")]
+            for fleet in args.heights
+        ]
+    except (ValueError, argparse.ArgumentTypeError) as error:
+        parser.error("argument --heights: %s" % error)
+    tasks = sweep_tasks(args.expes, args.plume_pos, heights, args.seeds)
+    callback = None
+    if args.watch:
+        from analytics import RunningSummary, format_table
+
+        statistics = RunningSummary()
+
+        def callback(summary):
+            statistics.add(summary)
+            runs = sum(group["runs"] for group in statistics.groups.values())
+            if runs % args.watch == 0:
+                print(format_table(statistics.summary()) + "\n")
+
+    rows = run_sweep(
+        tasks,
+        workers=args.workers,
+        results=args.results,
+        shared=args.shared,
+        frame_cache=args.frame_cache,
+        callback=callback,
+    )
+    print("%i experiments written to %s" % (rows, args.results))
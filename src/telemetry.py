@@ -0,0 +1,201 @@
+"""Binary log of the state of the UAVs at every tick, and its replay"""
+import os
+from threading import Lock
+from numpy import (
+    array,
+    diff,
+    dtype,
+    empty,
+    flatnonzero,
+    float32,
+    float64,
+    hypot,
+    int16,
+    int32,
+    memmap,
+    zeros,
+)
+from parameters import CELL_PARAMETERS, POLLUTANT_THRESHOLD, TELEMETRY_CHUNK
+
+# A fixed size record per UAV and tick
+RECORD = dtype(
+    [
+        ("time", float64),
+        ("uav", int16),
+        ("lat", float64),
+        ("lon", float64),
+        ("alt", float32),
+        ("x", int32),
+        ("y", int32),
+        ("pollutant", float32),
+        ("destination_x", int32),
+        ("destination_y", int32),
+        ("fitness", float64),
+        ("fitness_x", int32),
+        ("fitness_y", int32),
+    ]
+)
+
+
+class TelemetryLog:
+    """Append-only file of `RECORD`s.
+
+    The records are kept in a buffer of `chunk` records and appended to
+    `path` as raw bytes when it is full (and on `flush`/`close`), so the file
+    is always a whole number of records that `TelemetryReader` maps in
+    memory. `record` can be called from several threads.
+    """
+
+    def __init__(self, path: str, chunk: int = TELEMETRY_CHUNK):
+        self.path = path
+        self.buffer = zeros(chunk, dtype=RECORD)
+        self.size = 0
+        self.lock = Lock()
+        self.file = open(path, "ab")
+
+    def record(
+        self,
+        time,
+        uav,
+        location,
+        alt,
+        cell,
+        pollutant,
+        destination,
+        fitness,
+        fitness_cell,
+    ) -> None:
+        """Add the state of UAV `uav` at `time`"""
+        destination = destination if destination is not None else (-1, -1)
+        with self.lock:
+            self.buffer[self.size] = (
+                time,
+                uav,
+                location.lat,
+                location.lon,
+                alt,
+                cell[0],
+                cell[1],
+                pollutant,
+                destination[0],
+                destination[1],
+                fitness,
+                fitness_cell[0],
+                fitness_cell[1],
+            )
+            self.size += 1
+            if self.size == self.buffer.size:
+                self._write()
+
+    def _write(self) -> None:
+        """Append the buffered records to the file (called with the lock)"""
+        self.file.write(self.buffer[: self.size].tobytes())
+        self.size = 0
+
+    def flush(self) -> None:
+        """Write the buffered records"""
+        with self.lock:
+            self._write()
+            self.file.flush()
+
+    def close(self) -> None:
+        self.flush()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class TelemetryReader:
+    """Records of a `TelemetryLog`, mapped in memory (a trailing partial
+    record is ignored)"""
+
+    def __init__(self, path: str):
+        n_records = os.path.getsize(path) // RECORD.itemsize
+        if n_records:
+            self.records = memmap(path, RECORD, "r", shape=(n_records,))
+        else:
+            self.records = empty(0, dtype=RECORD)
+
+    def __len__(self) -> int:
+        return self.records.size
+
+    def uavs(self):
+        """Returns the ids of the UAVs in the log, sorted"""
+        return sorted(set(self.records["uav"].tolist()))
+
+    def track(self, uav: int):
+        """Returns the records of UAV `uav`"""
+        return self.records[self.records["uav"] == uav]
+
+    def ticks(self):
+        """Yields the time and the records of every tick"""
+        records = self.records
+        if records.size == 0:
+            return
+        bounds = flatnonzero(diff(records["time"])) + 1
+        starts = [0, *bounds.tolist()]
+        stops = [*bounds.tolist(), records.size]
+        for start, stop in zip(starts, stops):
+            yield records["time"][start], records[start:stop]
+
+    def frames(self, shape=None):
+        """Yields a `Plotter.snapshot` per tick, whose map (indexed [x, y]
+        as the measures of `CellMap`) holds the last measure of every
+        visited cell"""
+        if shape is None:
+            shape = (
+                CELL_PARAMETERS["cells_in_x"],
+                CELL_PARAMETERS["cells_in_y"],
+            )
+        measure = zeros(shape, dtype=float32)
+        paths = {uav: [] for uav in self.uavs()}
+        positions = {}
+        for time, records in self.ticks():
+            measure[records["x"], records["y"]] = records["pollutant"]
+            for record in records:
+                uav = int(record["uav"])
+                positions[uav] = (int(record["x"]), int(record["y"]))
+                paths[uav].append(positions[uav])
+            ids = sorted(positions)
+            yield {
+                "measure": measure.copy(),
+                "ids": ids,
+                "positions": [positions[uav] for uav in ids],
+                "paths": [
+                    array(paths[uav], dtype=float).reshape(-1, 2)
+                    for uav in ids
+                ],
+                "time": float(time),
+            }
+
+    def metrics(self, threshold: float = POLLUTANT_THRESHOLD) -> dict:
+        """Returns the first detection above `threshold`, the best measure
+        and the distance (in cells) flown by every UAV"""
+        records = self.records
+        metrics = {"records": int(records.size), "first": None, "best": None}
+        detected = flatnonzero(records["pollutant"] > threshold)
+        if detected.size:
+            metrics["first"] = _summary(records[detected[0]])
+        if records.size:
+            metrics["best"] = _summary(records[records["pollutant"].argmax()])
+        metrics["distance"] = {}
+        for uav in self.uavs():
+            track = self.track(uav)
+            steps = hypot(diff(track["x"]), diff(track["y"]))
+            metrics["distance"][uav] = float(steps.sum())
+        return metrics
+
+
+def _summary(record) -> dict:
+    """Returns the time, UAV, cell and value of a record"""
+    return {
+        "time": float(record["time"]),
+        "uav": int(record["uav"]),
+        "x": int(record["x"]),
+        "y": int(record["y"]),
+        "value": float(record["pollutant"]),
+    }
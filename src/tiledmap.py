@@ -0,0 +1,271 @@
+"""Likelihood map stored as tiles allocated on demand, for large areas"""
+from numpy import (
+    amax,
+    asarray,
+    broadcast_arrays,
+    broadcast_to,
+    exp,
+    full,
+    isnan,
+    isscalar,
+    log,
+    unique,
+    where,
+    zeros,
+)
+from cellmap import CellMap
+from parameters import MAP_TILE_SIZE
+
+
+class TiledLayer:
+    """2-D array of `shape` cells stored as square tiles of `tile_size`
+    cells, allocated on the first write. The cells of the missing tiles are
+    worth `fill`.
+
+    It is indexed like an array with a pair of integers, a pair of index
+    arrays or a pair of slices (with step 1), and it converts to a dense
+    array with `numpy.asarray`. A window write allocates no tile for the
+    blocks that only hold `fill`, and frees the tiles it overwrites with
+    `fill`. The writes are not thread-safe (a tile is allocated on a
+    check-then-set): `TiledCellMap` makes them holding its semaphore.
+    """
+
+    def __init__(self, shape, tile_size: int = MAP_TILE_SIZE, fill=0.0):
+        self.shape = tuple(shape)
+        self.tile_size = tile_size
+        self.fill = float(fill)
+        self.tiles = {}
+        self.n_tiles = (
+            -(-self.shape[0] // tile_size),
+            -(-self.shape[1] // tile_size),
+        )
+
+    def __getitem__(self, key):
+        x_index, y_index = key
+        if isinstance(x_index, slice):
+            return self._get_window(x_index, y_index)
+        return self._get_points(x_index, y_index)
+
+    def __setitem__(self, key, values) -> None:
+        x_index, y_index = key
+        if isinstance(x_index, slice):
+            self._set_window(x_index, y_index, values)
+        else:
+            self._set_points(x_index, y_index, values)
+
+    def __array__(self, dtype=None, copy=None):
+        return asarray(self.to_dense(), dtype=dtype)
+
+    def to_dense(self):
+        """Returns the whole layer as an array"""
+        return self[:, :]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(tile.nbytes for tile in self.tiles.values())
+
+    def _tile(self, key):
+        """Returns the tile `key`, allocating it if needed"""
+        tile = self.tiles.get(key)
+        if tile is None:
+            size = self.tile_size
+            tile = self.tiles[key] = full((size, size), self.fill, dtype=float)
+        return tile
+
+    def _blocks(self, x_slice: slice, y_slice: slice):
+        """Yields the key, the slices in the tile and the slices in the
+        window of every tile that overlaps the window"""
+        size = self.tile_size
+        x_0, x_1, _ = x_slice.indices(self.shape[0])
+        y_0, y_1, _ = y_slice.indices(self.shape[1])
+        for t_x in range(x_0 // size, (x_1 - 1) // size + 1):
+            lower_x = max(x_0, t_x * size)
+            upper_x = min(x_1, (t_x + 1) * size)
+            for t_y in range(y_0 // size, (y_1 - 1) // size + 1):
+                lower_y = max(y_0, t_y * size)
+                upper_y = min(y_1, (t_y + 1) * size)
+                yield (t_x, t_y), (
+                    slice(lower_x - t_x * size, upper_x - t_x * size),
+                    slice(lower_y - t_y * size, upper_y - t_y * size),
+                ), (
+                    slice(lower_x - x_0, upper_x - x_0),
+                    slice(lower_y - y_0, upper_y - y_0),
+                )
+
+    def _get_window(self, x_slice: slice, y_slice: slice):
+        """Returns a copy of the window"""
+        x_0, x_1, _ = x_slice.indices(self.shape[0])
+        y_0, y_1, _ = y_slice.indices(self.shape[1])
+        window = full(
+            (max(x_1 - x_0, 0), max(y_1 - y_0, 0)), self.fill, dtype=float
+        )
+        for key, in_tile, in_window in self._blocks(x_slice, y_slice):
+            tile = self.tiles.get(key)
+            if tile is not None:
+                window[in_window] = tile[in_tile]
+        return window
+
+    def _set_window(self, x_slice: slice, y_slice: slice, values) -> None:
+        """Write `values` in the window"""
+        x_0, x_1, _ = x_slice.indices(self.shape[0])
+        y_0, y_1, _ = y_slice.indices(self.shape[1])
+        if isscalar(values) and (x_0, x_1, y_0, y_1) == (
+            0,
+            self.shape[0],
+            0,
+            self.shape[1],
+        ):
+            # the whole layer: no tile is needed
+            self.tiles.clear()
+            self.fill = float(values)
+            return
+        values = broadcast_to(asarray(values), (x_1 - x_0, y_1 - y_0))
+        for key, in_tile, in_window in self._blocks(x_slice, y_slice):
+            block = values[in_window]
+            if (block == self.fill).all():
+                tile = self.tiles.get(key)
+                if tile is None:
+                    continue  # the background: no tile is needed
+                if in_tile == self._valid(key):
+                    del self.tiles[key]
+                    continue
+            self._tile(key)[in_tile] = block
+
+    def _tile_keys(self, x_index, y_index):
+        """Returns the flat tile number of every cell"""
+        size = self.tile_size
+        return (x_index // size) * self.n_tiles[1] + y_index // size
+
+    def _get_points(self, x_index, y_index):
+        """Returns the values of the cells"""
+        x_index, y_index = broadcast_arrays(asarray(x_index), asarray(y_index))
+        values = full(x_index.shape, self.fill, dtype=float)
+        keys = self._tile_keys(x_index, y_index)
+        size = self.tile_size
+        for key in unique(keys):
+            tile = self.tiles.get(divmod(int(key), self.n_tiles[1]))
+            if tile is not None:
+                mask = keys == key
+                values[mask] = tile[x_index[mask] % size, y_index[mask] % size]
+        return values[()]
+
+    def _set_points(self, x_index, y_index, values) -> None:
+        """Write the values of the cells (the last one wins in repeated
+        cells)"""
+        x_index, y_index, values = broadcast_arrays(
+            asarray(x_index), asarray(y_index), asarray(values)
+        )
+        keys = self._tile_keys(x_index, y_index)
+        size = self.tile_size
+        for key in unique(keys):
+            tile = self._tile(divmod(int(key), self.n_tiles[1]))
+            mask = keys == key
+            tile[x_index[mask] % size, y_index[mask] % size] = values[mask]
+
+    def _valid(self, key):
+        """Returns the slices of the cells of tile `key` inside the layer"""
+        size = self.tile_size
+        return (
+            slice(0, min(size, self.shape[0] - key[0] * size)),
+            slice(0, min(size, self.shape[1] - key[1] * size)),
+        )
+
+    def overview(self, transform=None):
+        """Returns the (n_tiles_x, n_tiles_y) coarse map with the sum of
+        `transform(values)` (or the values) over every tile"""
+        transform = transform if transform is not None else (lambda x: x)
+        overview = zeros(self.n_tiles)
+        fill = transform(asarray(self.fill, dtype=float))
+        for t_x in range(self.n_tiles[0]):
+            for t_y in range(self.n_tiles[1]):
+                rows, columns = self._valid((t_x, t_y))
+                tile = self.tiles.get((t_x, t_y))
+                if tile is None:
+                    overview[t_x, t_y] = fill * rows.stop * columns.stop
+                else:
+                    overview[t_x, t_y] = transform(tile[rows, columns]).sum()
+        return overview
+
+    def logsumexp(self) -> float:
+        """Returns log(sum(exp(values))) over the whole layer"""
+        missing = self.shape[0] * self.shape[1]
+        peak = self.fill
+        for key, tile in self.tiles.items():
+            rows, columns = self._valid(key)
+            missing -= rows.stop * columns.stop
+            peak = max(peak, amax(tile[rows, columns]))
+        total = missing * exp(self.fill - peak)
+        for key, tile in self.tiles.items():
+            total += exp(tile[self._valid(key)] - peak).sum()
+        return peak + log(total)
+
+    def shift(self, offset: float) -> None:
+        """Add `offset` to every cell"""
+        self.fill += offset
+        for tile in self.tiles.values():
+            tile += offset
+
+
+class TiledCellMap(CellMap):
+    """`CellMap` whose maps and measures are `TiledLayer`s, for search areas
+    too large for dense arrays.
+
+    Only the tiles of `tile_size` cells written by the UAVs measures, by
+    the plume of the frames and by the kernels of the updates are
+    allocated, so the memory and the cost of the updates follow the flown
+    area. The coarse `overview` gives the mass
+    of `gamma` per tile. `beta`, `gamma` and `log_gamma` return dense arrays
+    and are meant for small maps and plots.
+    """
+
+    def __init__(self, tile_size: int = MAP_TILE_SIZE, **kwarg):
+        self.tile_size = tile_size
+        super(TiledCellMap, self).__init__(**kwarg)
+
+    def _init_layers(self, layers: int) -> None:
+        """Allocate the (empty) tiled maps and measures layers"""
+        shape = (self.n_x, self.n_y)
+        n_cells = self.n_x * self.n_y
+        size = self.tile_size
+        self.S_tl_t_k = TiledLayer(shape, size, 1.0 / n_cells)
+        self.S_accum = TiledLayer(shape, size, 0.0)
+        self._log_gamma = TiledLayer(shape, size, -log(n_cells))
+        self.measures = [TiledLayer(shape, size, 0.0) for _ in range(layers)]
+
+    def set_frame(self, frame, index: int = 0, offset=(0, 0)) -> None:
+        """`CellMap.set_frame`. The NaN cells of `frame` (e.g. outside the
+        plume in `truth_frame`) are background and allocate no tile"""
+        frame = asarray(frame, dtype=float)
+        fill = self.measures[index].fill
+        super(TiledCellMap, self).set_frame(
+            where(isnan(frame), fill, frame), index, offset
+        )
+
+    def _renormalise(self) -> None:
+        """Recompute the mass of gamma from all the tiles and normalise its
+        logarithm"""
+        self._log_gamma.shift(-self._log_gamma.logsumexp())
+        self._log_mass = 0.0
+
+    def overview(self):
+        """Returns the mass of `gamma` in every tile"""
+        log_mass = self._log_mass
+        return self._log_gamma.overview(lambda value: exp(value - log_mass))
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the tiles"""
+        layers = [self.S_tl_t_k, self.S_accum, self._log_gamma]
+        return sum(layer.nbytes for layer in layers + self.measures)
+
+    @property
+    def beta(self):
+        """Normalised map of the accumulated detection events"""
+        if self._detections == 0:
+            return self.S_accum.to_dense()
+        return self.S_accum.to_dense() / self._detections
+
+    @property
+    def log_gamma(self):
+        """Logarithm of `gamma`"""
+        return self._log_gamma.to_dense() - self._log_mass
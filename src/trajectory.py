@@ -0,0 +1,60 @@
+"""Store of the positions visited by a UAV"""
+from numpy import asarray, empty
+
+
+class Trajectory:
+    """Preallocated array of (x, y) positions with amortised O(1) append.
+
+    It can be indexed like the (n, 2) array of the positions, and `view` and
+    `last` return views without copying them. With `maxlen` only the last
+    `maxlen` positions are kept (ring buffer).
+    """
+
+    def __init__(self, capacity: int = 64, maxlen=None):
+        if maxlen is not None:
+            capacity = 2 * maxlen
+        self.maxlen = maxlen
+        self._buffer = empty((max(capacity, 2), 2))
+        self._start = 0
+        self._stop = 0
+
+    def append(self, position) -> None:
+        """Add a position at the end of the trajectory"""
+        if self.maxlen is not None and len(self) == self.maxlen:
+            self._start += 1
+        if self._stop == self._buffer.shape[0]:
+            self._make_room()
+        self._buffer[self._stop] = position
+        self._stop += 1
+
+    def _make_room(self) -> None:
+        """Move the positions to the front of the buffer, growing it if it is
+        more than half full"""
+        size = len(self)
+        buffer = self._buffer
+        if 2 * size > buffer.shape[0]:
+            buffer = empty((2 * buffer.shape[0], 2))
+        buffer[:size] = self._buffer[self._start : self._stop]
+        self._buffer = buffer
+        self._start, self._stop = 0, size
+
+    def view(self):
+        """Returns the (n, 2) array of the positions (not a copy)"""
+        return self._buffer[self._start : self._stop]
+
+    def last(self, k: int):
+        """Returns the last `k` positions (not a copy)"""
+        return self._buffer[max(self._start, self._stop - k) : self._stop]
+
+    @property
+    def shape(self):
+        return (len(self), 2)
+
+    def __len__(self) -> int:
+        return self._stop - self._start
+
+    def __getitem__(self, key):
+        return self.view()[key]
+
+    def __array__(self, dtype=None, copy=None):
+        return asarray(self.view(), dtype=dtype)
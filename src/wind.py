@@ -0,0 +1,92 @@
+"""Wind series used to advect the probability map"""
+from numpy import (
+    load as load_data,
+    asarray,
+    broadcast_to,
+    clip,
+    concatenate,
+    cumsum,
+    floor,
+    sqrt,
+    zeros,
+)
+
+
+class WindField:
+    """Wind components sampled every `d_t` seconds.
+
+    The cumulative sums of both components (and of the speed) are computed
+    once, so the displacement over any time window is the difference of two
+    interpolated prefix sums. The wind is constant along each sample, so
+    fractional times are exact. A component with a single sample is taken
+    as constant over the whole series.
+    """
+
+    def __init__(self, wind_x=None, wind_y=None, d_t: float = 1.0):
+        if wind_x is None:
+            wind_x = load_data("databases/wind_x.npy")
+        if wind_y is None:
+            wind_y = load_data("databases/wind_y.npy")
+        wind_x = asarray(wind_x, dtype=float).reshape(-1)
+        wind_y = asarray(wind_y, dtype=float).reshape(-1)
+        n_samples = max(wind_x.size, wind_y.size)
+        self.v_x = broadcast_to(wind_x, (n_samples,))
+        self.v_y = broadcast_to(wind_y, (n_samples,))
+        self.speed = sqrt(self.v_x * self.v_x + self.v_y * self.v_y)
+        self.d_t = d_t
+        self.n_samples = n_samples
+        #
+        self._sum_x = _prefix_sum(self.v_x * d_t)
+        self._sum_y = _prefix_sum(self.v_y * d_t)
+        self._sum_speed = _prefix_sum(self.speed * d_t)
+
+    def displacement(self, t_0, t_k):
+        """Returns the (x, y) displacement of the air between the times
+        `t_0` and `t_k`, in seconds (scalars or arrays)"""
+        return (
+            self._integral(self._sum_x, t_k)
+            - self._integral(self._sum_x, t_0),
+            self._integral(self._sum_y, t_k)
+            - self._integral(self._sum_y, t_0),
+        )
+
+    def distance(self, t_0, t_k):
+        """Returns the distance flown by the air (integral of the speed)
+        between the times `t_0` and `t_k`"""
+        return self._integral(self._sum_speed, t_k) - self._integral(
+            self._sum_speed, t_0
+        )
+
+    def velocity(self, time):
+        """Returns the (v_x, v_y) wind at `time` seconds"""
+        index = clip(
+            floor(asarray(time) / self.d_t).astype(int), 0, self.n_samples - 1
+        )
+        return self.v_x[index], self.v_y[index]
+
+    def _integral(self, prefix, time):
+        """Interpolates the prefix sum at `time` seconds (clamped to the
+        series)"""
+        if isinstance(time, (int, float)):
+            # plain floats are much faster than NumPy scalars for one query
+            position = min(max(time / self.d_t, 0.0), self.n_samples)
+            index = min(int(position), self.n_samples - 1)
+            values = prefix[1]
+            return values[index] + (position - index) * (
+                values[index + 1] - values[index]
+            )
+        position = clip(
+            asarray(time, dtype=float) / self.d_t, 0, self.n_samples
+        )
+        index = clip(floor(position).astype(int), 0, self.n_samples - 1)
+        values = prefix[0]
+        return values[index] + (position - index) * (
+            values[index + 1] - values[index]
+        )
+
+
+def _prefix_sum(values):
+    """Returns the cumulative sum of `values`, starting with 0, as an array
+    and as a list"""
+    prefix = concatenate((zeros(1), cumsum(values)))
+    return prefix, prefix.tolist()
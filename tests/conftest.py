@@ -0,0 +1,5 @@
+"""The modules of src/ are imported by name, as main.py does"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
@@ -0,0 +1,58 @@
+"""Ground-truth frames of the plume on the map"""
+import pytest
+from numpy import arange, asarray, isnan, where
+from numpy.testing import assert_array_equal
+from cellmap import CellMap
+from parameters import CELL_PARAMETERS
+from pollutant import PollutantDistribution
+from tiledmap import TiledCellMap
+
+
+def _plume(reference_map):
+    """Returns a 40x30 m plume of distinct values on the map"""
+    return PollutantDistribution(
+        *reference_map.cell2gps((10, 20)),
+        dispersion=arange(40 * 30 * 2 * 3, dtype=float).reshape(40, 30, 2, 3),
+    )
+
+
+@pytest.mark.parametrize("map_class", [CellMap, TiledCellMap])
+def test_frame_of_a_non_square_map(map_class):
+    reference_map = map_class(
+        **dict(CELL_PARAMETERS, cells_in_x=120, cells_in_y=80)
+    )
+    plume = _plume(reference_map)
+    lats, lons = reference_map.y_lat, reference_map.x_lon
+    truth = plume.truth_frame(lats, lons, height=1, time=2)
+    assert truth.shape == (120, 80)
+    reference_map.set_frame(plume.measure_frame(lats, lons, truth=truth))
+    #
+    inside = 0
+    for x_index in range(120):
+        for y_index in range(80):
+            if isnan(truth[x_index, y_index]):
+                continue
+            inside += 1
+            position = reference_map.cell2gps((x_index, y_index))
+            expected = plume.measure_pollutant(position, height=1, time=2)
+            assert reference_map.measures[0][x_index, y_index] == expected
+    assert inside > 0
+
+
+def test_window_of_the_plume():
+    reference_map = TiledCellMap(
+        **dict(CELL_PARAMETERS, cells_in_x=120, cells_in_y=80)
+    )
+    plume = _plume(reference_map)
+    lats, lons = reference_map.y_lat, reference_map.x_lon
+    truth = plume.truth_frame(lats, lons, height=1, time=2)
+    x_window, y_window = plume.window(lats, lons)
+    assert not isnan(truth[x_window, y_window]).any()
+    assert (~isnan(truth)).sum() == truth[x_window, y_window].size
+    #
+    window = plume.truth_frame(lats[y_window], lons[x_window], 1, 2)
+    reference_map.set_frame(window, 0, (x_window.start, y_window.start))
+    assert_array_equal(
+        asarray(reference_map.measures[0]), where(isnan(truth), 0.0, truth)
+    )
+    assert len(reference_map.measures[0].tiles) == 1
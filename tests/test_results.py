@@ -0,0 +1,19 @@
+"""Store of the summaries of the experiments"""
+from results import FIELDNAMES, ResultsStore
+
+
+def test_load_while_compacting(tmp_path):
+    store = ResultsStore(str(tmp_path))
+    store.add({key: 1 for key in FIELDNAMES})
+    pending = store.pending
+
+    def compact_after_listing():
+        runs = pending()
+        store.pending = pending
+        store.compact()  # removes the JSON files just listed
+        return runs
+
+    store.pending = compact_after_listing
+    columns = store.load()
+    assert len(columns["run"]) == 1
+    assert columns["firstDT"].tolist() == [1.0]
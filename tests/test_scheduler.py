@@ -0,0 +1,20 @@
+"""Simulated time of the control loop"""
+import pytest
+from parameters import INITIAL_TIME_4_PLUME, SIMULATION_TIME
+from scheduler import FixedRateScheduler
+
+
+@pytest.mark.parametrize("rate", [1, 2, 3, 5, 10, 0.5])
+def test_plume_time_advances_once_per_second(rate):
+    scheduler = FixedRateScheduler(rate=rate, realtime=False)
+    periods = int(SIMULATION_TIME * rate)
+    plume_times = [
+        int(scheduler.time(period)) + INITIAL_TIME_4_PLUME - 1
+        for period in range(periods)
+    ]
+    assert plume_times == [
+        int(period // rate) + INITIAL_TIME_4_PLUME - 1
+        for period in range(periods)
+    ]
+    assert scheduler.time(periods) == SIMULATION_TIME
+    assert isinstance(scheduler.time(periods), int)
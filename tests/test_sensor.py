@@ -0,0 +1,26 @@
+"""Samples of the plume along the paths"""
+from numpy import arange
+from numpy.random import default_rng
+from numpy.testing import assert_array_equal
+from pollutant import PollutantDistribution
+
+
+def test_samples_and_frames_place_the_plume_at_the_same_cells():
+    plume = PollutantDistribution(
+        25.645656,
+        -100.288479,
+        dispersion=arange(40 * 30 * 2 * 4, dtype=float).reshape(40, 30, 2, 4),
+    )
+    rng = default_rng(0)
+    lats = plume.l_lat + (plume.u_lat - plume.l_lat) * rng.random(1000)
+    lons = plume.l_lon + (plume.u_lon - plume.l_lon) * rng.random(1000)
+    times = 3 * rng.random(1000)
+    assert_array_equal(
+        plume.sample(lats, lons, 1, times, method="nearest"),
+        plume.measure_points(lats, lons, 1, times.astype(int)),
+    )
+    # the interpolation in time starts from the same second
+    assert_array_equal(
+        plume.sample(lats, lons, 1, times.astype(int), method="time"),
+        plume.measure_points(lats, lons, 1, times.astype(int)),
+    )
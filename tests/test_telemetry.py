@@ -0,0 +1,16 @@
+"""Replay of the telemetry log"""
+from types import SimpleNamespace
+from numpy import zeros
+from telemetry import TelemetryLog, TelemetryReader
+
+
+def test_replayed_frames_are_indexed_as_the_map(tmp_path):
+    path = str(tmp_path / "telemetry.bin")
+    with TelemetryLog(path) as log:
+        location = SimpleNamespace(lat=25.6, lon=-100.2)
+        log.record(0, 1, location, 3, (7, 2), 0.5, None, 0.5, (7, 2))
+    (frame,) = TelemetryReader(path).frames(shape=(12, 8))
+    expected = zeros((12, 8))
+    expected[7, 2] = 0.5
+    assert (frame["measure"] == expected).all()
+    assert frame["positions"] == [(7, 2)]